@@ -9,10 +9,13 @@ Content indexer for MediaWiki image folders
 import logging
 import os
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
 from lodstorage.sql import SQLDB, EntityInfo
-from ngwidgets.progress import TqdmProgressbar
+
+if TYPE_CHECKING:
+    # the progress bars pull in nicegui - only needed for the annotations
+    from ngwidgets.progress import TqdmProgressbar
 
 logger = logging.getLogger(__name__)
 
@@ -132,7 +135,7 @@ class ContentIndexer:
         self,
         content_file: str,
         directory: str,
-        progressbar: Optional[TqdmProgressbar] = None,
+        progressbar: Optional["TqdmProgressbar"] = None,
     ) -> int:
         """
         Import content file into database, skip comment lines.
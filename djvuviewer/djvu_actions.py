@@ -437,9 +437,7 @@ class DjVuActions:
             )
             # Use the new store() method with DjVuFile objects
             if updated_files:
-                self.djvu_files.store(
-                    updated_files, sample_record_count=min(10, len(updated_files))
-                )
+                self.djvu_files.store(updated_files)
 
     def report_errors(self, profiler: Profiler = None) -> None:
         """
@@ -474,16 +472,15 @@ class DjVuActions:
                     )
                     print("📜", tb)
 
-    def catalog_and_store(self, limit: int, sample_record_count: int = 1) -> None:
+    def catalog_and_store(self, limit: int) -> None:
         """
         Execute catalog operation and store results in database.
 
         Args:
             limit: Maximum number of pages to process
-            sample_record_count: Number of sample records for schema inference
         """
         djvu_files = self.catalog_djvu(limit=limit)
-        self.djvu_files.store(djvu_files, sample_record_count=sample_record_count)
+        self.djvu_files.store(djvu_files)
 
     def convert_from_database(
         self, serial: bool = False, url: Optional[str] = None
@@ -20,7 +20,7 @@ from typing import Callable, Dict, List, Optional
 from basemkit.shell import Shell
 
 from djvuviewer.djvu_config import DjVuConfig
-from djvuviewer.djvu_core import DjVuFile
+from djvuviewer.djvu_core import BaseFile, DjVuFile
 from djvuviewer.image_convert import ImageConverter
 from djvuviewer.packager import Packager
 
@@ -103,6 +103,10 @@ class DjVuBundle(DjVuBundleFile):
         self.errors: List[str] = []
         self.shell = Shell()
         self.djvu_dump_log = None
+        # generated bundling scripts keyed by the update_index_db option
+        self.bundling_scripts: Dict[bool, str] = {}
+        # file info of the backup see check_backup
+        self.backup_base_file: Optional[BaseFile] = None
 
     @property
     def error_count(self) -> int:
@@ -547,6 +551,7 @@ class DjVuBundle(DjVuBundleFile):
         get the docker exec command to update the mediawiki
         """
         djvu_path = self.djvu_file.path
+        docker_cmd = ""
         # MediaWiki maintenance call if container is configured
         if hasattr(self.config, "container_name") and self.config.container_name:
             filename = os.path.basename(djvu_path)
@@ -595,6 +600,34 @@ class DjVuBundle(DjVuBundleFile):
             self._add_error(msg)
             return False, msg
 
+    def check_backup(self) -> BaseFile:
+        """
+        Check my backup file and remember its file info - needs
+        to be called again when the backup has been created.
+
+        Returns:
+            BaseFile: the file info of the backup file
+        """
+        self.backup_base_file = BaseFile.of_path(self.backup_file)
+        return self.backup_base_file
+
+    def get_bundling_script(self, update_index_db: bool = False) -> str:
+        """
+        Get the bundling script - generated once per option value since
+        the generation runs djvudump.
+
+        Args:
+            update_index_db: if True include the index database update step
+
+        Returns:
+            str: the bundling script
+        """
+        script = self.bundling_scripts.get(update_index_db)
+        if script is None:
+            script = self.generate_bundling_script(update_index_db=update_index_db)
+            self.bundling_scripts[update_index_db] = script
+        return script
+
     def generate_bundling_script(self, update_index_db: bool = False) -> str:
         """
         Generate an idempotent bash script for bundling.
@@ -901,6 +934,7 @@ main "$@"
             if create_backup and not os.path.exists(zip_path):
                 progress(f"Creating backup ZIP...")
                 zip_path = self.create_backup_zip()
+                self.check_backup()
                 if self.error_count > 0:
                     error(f"Backup failed with {self.error_count} errors")
                     return False
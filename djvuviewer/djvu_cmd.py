@@ -222,7 +222,7 @@ class DjVuCmd(BaseCmd):
 
         Scans DjVu files and stores their metadata in the database.
         """
-        self.actions.catalog_and_store(limit=self.args.limit, sample_record_count=1)
+        self.actions.catalog_and_store(limit=self.args.limit)
         self.actions.report_errors(profiler=self.profiler)
 
     def convert(self) -> None:
@@ -66,6 +66,10 @@ class DjVuConfig:
     timeout: float = (
         60  # maximum number of secs to wait for a background task to complete
     )
+    fetch_concurrency: int = 4  # maximum number of parallel MediaWiki API requests
+    wal_mode: bool = (
+        False  # open the djvu index db in WAL mode - converts the db file for good
+    )
 
     def __post_init__(self):
         """
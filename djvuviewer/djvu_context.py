@@ -4,12 +4,16 @@ Created on 2026-01-04
 @author: wf
 """
 
+import threading
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 
 from ngwidgets.progress import Progressbar
 
 from djvuviewer.djvu_bundle import DjVuBundle
 from djvuviewer.djvu_config import DjVuConfig
+from djvuviewer.djvu_core import DjVuPage
 from djvuviewer.djvu_files import DjVuFiles
 from djvuviewer.djvu_processor import DjVuProcessor
 from djvuviewer.packager import PackageMode
@@ -23,18 +27,30 @@ class DjVuContext:
     def __init__(self, config: DjVuConfig, args: Namespace):
         self.config = config
         self.args = args
-        # Initialize manager and processor
+        # Initialize manager - the processor is created on first use
         self.djvu_files = DjVuFiles(config=self.config)
         self.package_mode = PackageMode.from_name(self.config.package_mode)
-        self.dproc = DjVuProcessor(
-            debug=self.args.debug,
-            verbose=self.args.verbose,
-            package_mode=self.package_mode,
-            batch_size=self.args.batch_size,
-            limit_gb=self.args.limit_gb,
-            max_workers=self.args.max_workers,
-            pngmode=self.args.pngmode,
-        )
+        self._dproc = None
+        self.dproc_lock = threading.Lock()
+
+    @property
+    def dproc(self) -> DjVuProcessor:
+        """
+        Lazy initialization of the DjVuProcessor and its decoding context -
+        one instance is shared by all users of this context.
+        """
+        with self.dproc_lock:
+            if self._dproc is None:
+                self._dproc = DjVuProcessor(
+                    debug=self.args.debug,
+                    verbose=self.args.verbose,
+                    package_mode=self.package_mode,
+                    batch_size=self.args.batch_size,
+                    limit_gb=self.args.limit_gb,
+                    max_workers=self.args.max_workers,
+                    pngmode=self.args.pngmode,
+                )
+        return self._dproc
 
     def warmup_image_cache(self, pbar: Progressbar):
         """
@@ -49,13 +65,21 @@ class DjVuContext:
                 url=self.config.new_url, name="new", limit=10000, progressbar=pbar
             )
 
-    def load_djvu_file(self, page_title: str, progressbar=None) -> DjVuBundle:
+    def load_djvu_file(
+        self,
+        page_title: str,
+        progressbar=None,
+        force: bool = False,
+        page_callback: Optional[Callable[[DjVuPage], None]] = None,
+    ) -> DjVuBundle:
         """
         Load DjVu file metadata via DjVuFiles interface.
 
         Args:
             page_title: The page title to load
             progressbar: Optional progressbar for feedback
+            force: if True parse the DjVu file even if it is unchanged on disk
+            page_callback: Optional callback for each page as soon as it is loaded
 
         Returns:
             DjVuBundle: Bundle with loaded images and DjVu file data
@@ -64,21 +88,27 @@ class DjVuContext:
             ValueError: If image not found in any wiki
             Exception: For other loading errors
         """
-        # Fetch image metadata from wikis using DjVuFiles
+        # Fetch image metadata from both wikis concurrently using DjVuFiles
         mw_images = {}
-
-        wiki_images = self.djvu_files.fetch_images(
-            url=self.config.base_url, name="wiki", titles=[page_title]
-        )
-        if wiki_images:
-            mw_images["wiki"] = wiki_images[0]
-
+        wiki_urls = {"wiki": self.config.base_url}
         if self.config.new_url:
-            new_images = self.djvu_files.fetch_images(
-                url=self.config.new_url, name="new", titles=[page_title]
-            )
-            if new_images:
-                mw_images["new"] = new_images[0]
+            wiki_urls["new"] = self.config.new_url
+
+        with ThreadPoolExecutor(max_workers=len(wiki_urls)) as executor:
+            image_futures = {
+                name: executor.submit(
+                    self.djvu_files.fetch_images,
+                    url=url,
+                    name=name,
+                    titles=[page_title],
+                )
+                for name, url in wiki_urls.items()
+            }
+            # keep the wiki, new order - the first image determines the path
+            for name, image_future in image_futures.items():
+                images = image_future.result()
+                if images:
+                    mw_images[name] = images[0]
 
         if not mw_images:
             raise ValueError(f"Image not found in any wiki: {page_title}")
@@ -86,12 +116,20 @@ class DjVuContext:
         # Use first available image to determine path
         active_image = next(iter(mw_images.values()))
         djvu_file = self.dproc.get_djvu_file(
-            url=active_image.url, config=self.config, progressbar=progressbar
+            url=active_image.url,
+            config=self.config,
+            progressbar=progressbar,
+            force=force,
+            page_callback=page_callback,
         )
+        # compute the page size aggregate once while still off the UI thread
+        djvu_file.warm_aggregates()
 
         # Create bundle with MediaWiki metadata
         djvu_bundle = DjVuBundle(
             djvu_file, config=self.config, debug=self.args.debug, mw_images=mw_images
         )
+        # stat the backup once per load instead of on every ui update
+        djvu_bundle.check_backup()
 
         return djvu_bundle
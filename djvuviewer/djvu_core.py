@@ -6,15 +6,107 @@ Created on 2025-02-25
 
 import datetime
 import os
-from dataclasses import dataclass, field
+import time
+from dataclasses import dataclass, field, fields
+from functools import cached_property, lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
 
 import numpy
 from basemkit.yamlable import lod_storable
 
 from djvuviewer.packager import Packager
 
+try:
+    from numba import njit
+except ImportError:
+    # numba is an optional accelerator - plain python is used without it
+    njit = None
+
+
+def sum_sizes(sizes: numpy.ndarray) -> int:
+    """
+    Sum up the given array of sizes.
+
+    Args:
+        sizes: int64 array of sizes
+
+    Returns:
+        the total of all sizes
+    """
+    total = 0
+    for i in range(sizes.shape[0]):
+        total += sizes[i]
+    return total
+
+
+def aggregate_pages(
+    filesizes: numpy.ndarray, widths: numpy.ndarray, heights: numpy.ndarray
+) -> Tuple[int, int, int]:
+    """
+    Aggregate the page columns in a single pass.
+
+    Args:
+        filesizes: int64 array of page file sizes
+        widths: int64 array of page widths
+        heights: int64 array of page heights
+
+    Returns:
+        the total size and the maximum width and height
+    """
+    total = 0
+    max_width = 0
+    max_height = 0
+    for i in range(filesizes.shape[0]):
+        total += filesizes[i]
+        if widths[i] > max_width:
+            max_width = widths[i]
+        if heights[i] > max_height:
+            max_height = heights[i]
+    return total, max_width, max_height
+
+
+if njit is not None:
+    # explicit signatures compile eagerly at import time and the
+    # on disk cache keeps the machine code across runs - the column
+    # arrays of DjVuFile.get_page_array are contiguous int64 arrays
+    sum_sizes = njit("int64(int64[::1])", cache=True)(sum_sizes)
+    aggregate_pages = njit(
+        "UniTuple(int64, 3)(int64[::1], int64[::1], int64[::1])", cache=True
+    )(aggregate_pages)
+
+
+@lru_cache(maxsize=None)
+def init_field_names(cls: type) -> Tuple[str, ...]:
+    """
+    Get the names of the init fields of the given dataclass.
+
+    Args:
+        cls: the dataclass
+
+    Returns:
+        the field names in declaration order
+    """
+    field_names = tuple(f.name for f in fields(cls) if f.init)
+    return field_names
+
+
+@lru_cache(maxsize=None)
+def init_field_getter(cls: type) -> itemgetter:
+    """
+    Get an extractor for the init field values of the given dataclass
+    from a record - built once per class.
+
+    Args:
+        cls: the dataclass
+
+    Returns:
+        an itemgetter returning the field values in declaration order
+    """
+    field_getter = itemgetter(*init_field_names(cls))
+    return field_getter
+
 
 @dataclass
 class BaseFile:
@@ -45,16 +137,19 @@ class BaseFile:
     def get_fileinfo(filepath: str):
         filesize = None
         iso_date = None
-        if os.path.exists(filepath):
+        try:
+            # a single stat call for size and modification time
+            stat = os.stat(filepath)
+        except FileNotFoundError:
+            stat = None
+        if stat is not None:
             # Set file size in bytes
-            filesize = os.path.getsize(filepath)
+            filesize = stat.st_size
 
             # Get file modification time and convert to UTC ISO format with second precision
-            mtime = os.path.getmtime(filepath)
-            datetime_obj = datetime.datetime.fromtimestamp(
-                mtime, tz=datetime.timezone.utc
+            iso_date = time.strftime(
+                "%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(stat.st_mtime)
             )
-            iso_date = datetime_obj.isoformat(timespec="seconds")
         return iso_date, filesize
 
     def set_fileinfo(self, filepath: str):
@@ -68,6 +163,31 @@ class BaseFile:
         self.filename = os.path.basename(filepath)
         self.iso_date, self.filesize = self.get_fileinfo(filepath)
 
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "BaseFile":
+        """
+        Create an instance from a flat database record.
+
+        In contrast to the generic from_dict no type decoding is done
+        since the database columns already have the types of the fields.
+        Columns without a field e.g. page_rank are ignored and missing
+        columns get the field defaults.
+
+        Args:
+            record: the database record
+
+        Returns:
+            the instance
+        """
+        field_names = init_field_names(cls)
+        try:
+            # a single C level multi key fetch for complete records
+            kwargs = dict(zip(field_names, init_field_getter(cls)(record)))
+        except KeyError:
+            kwargs = {name: record[name] for name in field_names if name in record}
+        instance = cls(**kwargs)
+        return instance
+
     @classmethod
     def of_path(cls, path: str) -> "BaseFile":
         base_file = cls()
@@ -116,9 +236,24 @@ class DjVuPage(BaseFile):
         Returns the PNG file name derived from the DjVu file path and page index.
         """
         prefix = os.path.splitext(os.path.basename(self.djvu_path))[0]
-        png_file = f"{prefix}_page_{self.page_index:04d}.png"
+        png_file = DjVuPage.png_filename(prefix, self.page_index)
         return png_file
 
+    @staticmethod
+    def png_filename(prefix: str, page_index: int) -> str:
+        """
+        Get the PNG file name for the given DjVu file stem and page index.
+
+        Args:
+            prefix: the stem of the DjVu file path
+            page_index: the 1-based page index
+
+        Returns:
+            str: the PNG file name
+        """
+        png_filename = f"{prefix}_page_{page_index:04d}.png"
+        return png_filename
+
     @classmethod
     def get_sample(cls):
         """Returns a sample DjVuPage instance for testing."""
@@ -171,6 +306,152 @@ class DjVuFile(DjVu):
 
     pages: List[DjVuPage] = field(default_factory=list)
 
+    # minimum page count for which the column array reductions pay off
+    JIT_PAGE_THRESHOLD: ClassVar[int] = 256
+
+    # page caches - cached_property values are not dataclass fields and
+    # therefore not serialized
+    @cached_property
+    def page_arrays(self) -> Dict[str, numpy.ndarray]:
+        """My page column arrays by attribute - filled by get_page_array."""
+        page_arrays = {}
+        return page_arrays
+
+    @cached_property
+    def page_totals(self) -> Dict[str, Tuple[int, int]]:
+        """My page totals by attribute as (page count, total)."""
+        page_totals = {}
+        return page_totals
+
+    def get_page_array(self, attr: str) -> numpy.ndarray:
+        """
+        Get the given numeric attribute of my pages as int64 column array
+        with None mapped to 0. The arrays are cached and rebuilt when
+        the number of pages changes.
+
+        Args:
+            attr: the page attribute e.g. filesize, width, height or dpi
+
+        Returns:
+            numpy.ndarray: the page attribute values
+        """
+        pages = self.pages or []
+        page_count = len(pages)
+        page_arrays = self.page_arrays
+        page_array = page_arrays.get(attr)
+        if page_array is None or len(page_array) != page_count:
+            page_array = numpy.fromiter(
+                ((getattr(page, attr) or 0) for page in pages),
+                dtype=numpy.int64,
+                count=page_count,
+            )
+            page_arrays[attr] = page_array
+        return page_array
+
+    def get_page_filesizes(self) -> numpy.ndarray:
+        """
+        Get the filesizes of my pages as int64 array with None mapped to 0.
+
+        Returns:
+            numpy.ndarray: the page filesizes
+        """
+        page_filesizes = self.get_page_array("filesize")
+        return page_filesizes
+
+    @property
+    def total_page_size(self) -> int:
+        """
+        Total size of all my pages in bytes - large documents are reduced
+        via the filesize column array with the numba compiled reduction
+        if numba is available and numpy otherwise.
+        The aggregate is cached and recomputed when the number of pages changes.
+        """
+        pages = self.pages or []
+        page_count = len(pages)
+        cached = self.page_totals.get("filesize")
+        if cached is not None and cached[0] == page_count:
+            total_page_size = cached[1]
+        else:
+            if page_count >= self.JIT_PAGE_THRESHOLD:
+                page_filesizes = self.get_page_filesizes()
+                if njit is not None:
+                    total_page_size = int(sum_sizes(page_filesizes))
+                else:
+                    total_page_size = int(page_filesizes.sum())
+            else:
+                total_page_size = sum((page.filesize or 0) for page in pages)
+            self.page_totals["filesize"] = (page_count, total_page_size)
+        return total_page_size
+
+    def get_page_aggregates(self) -> Tuple[int, int, int]:
+        """
+        Get the total page size and the maximum page width and height
+        from the page column arrays - in one compiled pass if numba is available.
+
+        Returns:
+            Tuple[int, int, int]: total size, max width and max height
+        """
+        filesizes = self.get_page_array("filesize")
+        widths = self.get_page_array("width")
+        heights = self.get_page_array("height")
+        if len(filesizes) == 0:
+            aggregates = (0, 0, 0)
+        elif njit is not None:
+            total, max_width, max_height = aggregate_pages(filesizes, widths, heights)
+            aggregates = (int(total), int(max_width), int(max_height))
+        else:
+            aggregates = (
+                int(filesizes.sum()),
+                int(widths.max()),
+                int(heights.max()),
+            )
+        return aggregates
+
+    def warm_aggregates(self) -> int:
+        """
+        Compute and cache my page size aggregate up front - e.g. off the UI thread
+        so that the later rendering does not pay for them.
+
+        Returns:
+            int: the total page size
+        """
+        total_page_size = self.total_page_size
+        return total_page_size
+
+    # derived summaries - a loaded DjVuFile is not modified so they are computed once
+    @cached_property
+    def first_page(self) -> Optional[DjVuPage]:
+        """My first page or None if I have no pages."""
+        first_page = self.pages[0] if self.pages else None
+        return first_page
+
+    @cached_property
+    def format_type_str(self) -> str:
+        """The DjVu document format."""
+        format_type_str = "Bundled" if self.bundled else "Indirect/Indexed"
+        return format_type_str
+
+    @cached_property
+    def dims_str(self) -> str:
+        """The dimensions of my first page."""
+        page = self.first_page
+        dims_str = f"{page.width}×{page.height}" if (page and page.width) else "—"
+        return dims_str
+
+    @cached_property
+    def dpi_str(self) -> str:
+        """The resolution of my first page."""
+        page = self.first_page
+        dpi_str = str(page.dpi) if (page and page.dpi) else "—"
+        return dpi_str
+
+    @cached_property
+    def max_dims_str(self) -> str:
+        """The maximum width and height of my pages."""
+        _total, max_width, max_height = self.get_page_aggregates()
+        max_dims_str = f"{max_width}×{max_height}" if max_width else "—"
+        return max_dims_str
+
     def get_page_by_page_index(self, page_index: int) -> Optional[DjVuPage]:
         """
         Retrieve a page by its page index.
@@ -195,14 +476,17 @@ class DjVuFile(DjVu):
             package_path (Path): Path to the package
         """
         djvu_file = None
-        if package_path.exists():
-            yaml_filename = f"{package_path.stem}.yaml"
-
-            yaml_data = Packager.read_from_package(package_path, yaml_filename).decode(
-                "utf-8"
-            )
-            djvu_file = cls.from_yaml(yaml_data)
-            djvu_file.set_fileinfo(package_path)
+        yaml_filename = f"{package_path.stem}.yaml"
+        try:
+            yaml_data = Packager.load_yaml_from_package(package_path, yaml_filename)
+        except FileNotFoundError:
+            # the package is there but has no index file
+            if package_path.exists():
+                raise
+            # no package - the load's stat already told us
+            return djvu_file
+        djvu_file = cls.from_dict(yaml_data)
+        djvu_file.set_fileinfo(package_path)
         return djvu_file
 
 
@@ -212,7 +496,7 @@ class DjVuViewPage:
     page: DjVuPage
     base_path: str
 
-    @property
+    @cached_property
     def content_path(self) -> str:
         """Path for content retrieval"""
         return f"{Path(self.base_path).stem}/{self.page.png_file}"
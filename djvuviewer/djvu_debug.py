@@ -6,11 +6,13 @@ Created on 2026-01-02
 @author: wf
 """
 
+import asyncio
+import os
+import string
 import urllib.parse
-from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-from ngwidgets.lod_grid import ListOfDictsGrid
+from ngwidgets.lod_grid import GridConfig, ListOfDictsGrid
 from ngwidgets.progress import NiceguiProgressbar
 from ngwidgets.task_runner import TaskRunner
 from ngwidgets.widgets import Link
@@ -25,6 +27,82 @@ class DjVuDebug:
     UI for displaying debug/info page for a DjVu document.
     """
 
+    # fixed attribute layout - all attributes are initialized in __init__
+    __slots__ = (
+        "solution",
+        "context",
+        "config",
+        "webserver",
+        "djvu_files",
+        "progressbar",
+        "page_title",
+        "djvu_file",
+        "djvu_bundle",
+        "total_pages",
+        "view_lod",
+        "view_lod_cache",
+        "lod_grid",
+        "task_runner",
+        "zip_file",
+        "bundled_file",
+        "update_index_db",
+        "update_wiki",
+        "create_package",
+        "use_sudo",
+        "package_type",
+        "bundling_enabled",
+        "ui_container",
+        "bundle_state_container",
+        "header_row",
+        "refresh_button",
+        "bundle_button",
+        "progress_row",
+        "card_row",
+        "content_row",
+        "header_html_element",
+        "header_html",
+        "last_content_key",
+        "streamed_pages",
+        "stream_timer",
+        "flushed_pages",
+        "__weakref__",
+    )
+
+    # header card markup - $rows are the label/value rows, $extra follows the grid
+    HEADER_TEMPLATE = string.Template(
+        "<div style='display: flex; flex-wrap: wrap; gap: 16px;'>"
+        "<div style='border: 1px solid #ddd; padding: 10px; border-radius: 4px; min-width: 300px;'>"
+        "<div style='display: grid; grid-template-columns: auto 1fr; gap: 4px 12px; font-size: 0.9em;'>"
+        "$rows</div>$extra</div></div>"
+    )
+
+    # header rows as (label, getter, span style) - getters take the DjVuFile
+    HEADER_SCHEMA = (
+        ("Path", lambda f: f.path, "word-break: break-all;"),
+        ("Format", lambda f: f.format_type_str, ""),
+        ("Pages (Doc)", lambda f: f.page_count, ""),
+        ("Pages (Dir)", lambda f: f.dir_pages or "—", ""),
+        ("Dimensions", lambda f: f.dims_str, ""),
+        ("Max Dimensions", lambda f: f.max_dims_str, ""),
+        ("DPI", lambda f: f.dpi_str, ""),
+        ("File Date", lambda f: f.iso_date or "—", ""),
+        (
+            "Main Size",
+            lambda f: f"{f.filesize:,} bytes" if f.filesize else None,
+            "",
+        ),
+        ("Pages Size", lambda f: f"{f.total_page_size:,} bytes", ""),
+        (
+            "Package",
+            lambda f: (
+                f"{f.package_filesize:,} bytes ({f.package_iso_date})"
+                if f.package_filesize
+                else None
+            ),
+            "",
+        ),
+    )
+
     def __init__(
         self,
         solution,
@@ -52,6 +130,8 @@ class DjVuDebug:
         self.djvu_bundle = None
         self.total_pages = 0
         self.view_lod = []
+        # (DjVuFile, signature, page records) of the last get_view_lod
+        self.view_lod_cache = None
         self.lod_grid = None
         self.task_runner = TaskRunner(timeout=self.config.timeout)
         self.zip_file: Optional[BaseFile] = None
@@ -67,6 +147,22 @@ class DjVuDebug:
 
         self.ui_container = None
         self.bundle_state_container = None
+        # ui elements created in setup_ui
+        self.header_row = None
+        self.refresh_button = None
+        self.bundle_button = None
+        self.progress_row = None
+        self.card_row = None
+        self.content_row = None
+        self.header_html_element = None
+        # the header markup - the header element is bound to it
+        self.header_html = ""
+        # the content key of the DjVu file state last rendered
+        self.last_content_key = None
+        # pages reported by the loader thread - shown in the grid while loading
+        self.streamed_pages = []
+        self.stream_timer = None
+        self.flushed_pages = 0
 
     def authenticated(self) -> bool:
         """
@@ -75,98 +171,61 @@ class DjVuDebug:
         allow = self.solution.webserver.authenticated()
         return allow
 
+    @staticmethod
+    def label_value(label: str, value, span_style: str = "") -> str:
+        """Helper to create a label-value HTML row."""
+        if not value and value != 0:  # Skip if empty/None but allow 0
+            return ""
+        style_attr = f" style='{span_style}'" if span_style else ""
+        return f"<strong>{label}:</strong><span{style_attr}>{value}</span>"
+
     def get_header_html(self) -> str:
         """Helper to generate HTML summary our DjVuFile instance."""
-
-        def label_value(label: str, value, span_style: str = "") -> str:
-            """Helper to create a label-value HTML row."""
-            if not value and value != 0:  # Skip if empty/None but allow 0
-                return ""
-            style_attr = f" style='{span_style}'" if span_style else ""
-            return f"<strong>{label}:</strong><span{style_attr}>{value}</span>"
-
-        def link_list():
-            """
-            get the available image links
-            """
-            links = []
-            # Fixed: Access through djvu_bundle with null check
-            if self.djvu_bundle and self.djvu_bundle.image_wiki:
-                links.append(label_value("Wiki", view_record.get("wiki", "")))
-            if self.djvu_bundle and self.djvu_bundle.image_new:
-                links.append(label_value("New", view_record.get("new", "")))
-            links.append(label_value("Package", view_record.get("package", "")))
-            return links
-
+        label_value = DjVuDebug.label_value
+        djvu_bundle = self.djvu_bundle
         djvu_file = self.djvu_file
         view_record = {}
         filename = self.page_title
         self.djvu_files.add_links(view_record, filename)
 
+        # the available image links as (label, link) candidates
+        has_wiki = bool(djvu_bundle and djvu_bundle.image_wiki)
+        has_new = bool(djvu_bundle and djvu_bundle.image_new)
+        link_candidates = (
+            ("Wiki", view_record.get("wiki") if has_wiki else None),
+            ("New", view_record.get("new") if has_new else None),
+            ("Package", view_record.get("package")),
+        )
+        # one row per schema entry - empty values are skipped by label_value
+        schema = DjVuDebug.HEADER_SCHEMA if djvu_file else ()
+        rows = "".join(
+            [label_value(label, link) for label, link in link_candidates]
+            + [
+                label_value(label, getter(djvu_file), style)
+                for label, getter, style in schema
+            ]
+        )
+
+        extra = ""
         if not djvu_file:
-            links_html = "".join(link_list())
             wiki_url = None
-            if self.djvu_bundle and self.djvu_bundle.image_wiki:
-                wiki_url = self.djvu_bundle.descriptionurl_wiki
-            elif self.djvu_bundle and self.djvu_bundle.image_new:
-                wiki_url = self.djvu_bundle.descriptionurl_new
+            if has_wiki:
+                wiki_url = djvu_bundle.description_url_wiki
+            elif has_new:
+                wiki_url = djvu_bundle.description_url_new
 
             if not wiki_url:
                 wiki_url = f"{self.config.base_url}/File:{self.page_title}"
-            error_html = f"<div>No DjVu file information loaded for <a href='{wiki_url}'>{self.page_title}</a></div>"
-            markup = f"<div style='border: 1px solid #ddd; padding: 10px; border-radius: 4px; min-width: 300px;'><div style='display: grid; grid-template-columns: auto 1fr; gap: 4px 12px; font-size: 0.9em;'>{links_html}</div>{error_html}</div>"
-            return markup
-
-        format_type = "Bundled" if djvu_file.bundled else "Indirect/Indexed"
-
-        # Safe aggregations
-        total_page_size = sum((p.filesize or 0) for p in (djvu_file.pages or []))
-
-        # Safe first page access
-        first_page = djvu_file.pages[0] if djvu_file.pages else None
-
-        dims = (
-            f"{first_page.width}×{first_page.height}"
-            if (first_page and first_page.width)
-            else "—"
-        )
-        dpi = first_page.dpi if (first_page and first_page.dpi) else "—"
-
-        package_info = (
-            f"{djvu_file.package_filesize:,} bytes ({djvu_file.package_iso_date})"
-            if djvu_file.package_filesize
-            else None
-        )
-
-        main_size = f"{djvu_file.filesize:,} bytes" if djvu_file.filesize else None
-
-        # Build HTML
-        html_parts = [
-            "<div style='border: 1px solid #ddd; padding: 10px; border-radius: 4px; min-width: 300px;'>",
-            "<div style='display: grid; grid-template-columns: auto 1fr; gap: 4px 12px; font-size: 0.9em;'>",
-            *link_list(),
-            label_value("Path", djvu_file.path, "word-break: break-all;"),
-            label_value("Format", format_type),
-            label_value("Pages (Doc)", djvu_file.page_count),
-            label_value("Pages (Dir)", djvu_file.dir_pages or "—"),
-            label_value("Dimensions", dims),
-            label_value("DPI", dpi),
-            label_value("File Date", djvu_file.iso_date or "—"),
-            label_value("Main Size", main_size),
-            label_value("Pages Size", f"{total_page_size:,} bytes"),
-            label_value("Package", package_info),
-            "</div></div>",
-        ]
-
-        markup = f"<div style='display: flex; flex-wrap: wrap; gap: 16px;'>{''.join(html_parts)}</div>"
+            extra = f"<div>No DjVu file information loaded for <a href='{wiki_url}'>{self.page_title}</a></div>"
+        markup = DjVuDebug.HEADER_TEMPLATE.substitute(rows=rows, extra=extra)
         return markup
 
     def setup_djvu_info(self):
-        # Generate header HTML
-        header_html = self.get_header_html()
-
-        # Header
-        ui.html(header_html)
+        """
+        update the header with the DjVu file info - the binding
+        only sends the markup to the client if it changed
+        """
+        self.header_html = self.get_header_html()
 
     def file_label(self, base_file: BaseFile):
         # Add size and iso_date labels when available
@@ -205,7 +264,9 @@ class DjVuDebug:
                 self.file_label(self.bundled_file)
 
             # Backup file - just a disabled checkbox and download link
-            self.zip_file = BaseFile.of_path(self.djvu_bundle.backup_file)
+            self.zip_file = (
+                self.djvu_bundle.backup_base_file or self.djvu_bundle.check_backup()
+            )
             self.create_package = not self.zip_file.exists
             with ui.row().classes("gap-4 items-center"):
                 ui.checkbox("Backup exists", value=self.zip_file.exists).props(
@@ -223,18 +284,48 @@ class DjVuDebug:
 
             with ui.expansion("Bundling script", icon="code"):
                 # Script
-                script = self.djvu_bundle.generate_bundling_script(
+                script = self.djvu_bundle.get_bundling_script(
                     update_index_db=self.update_index_db
                 )
                 ui.code(script, language="bash").classes("w-full text-xs")
 
-    def create_page_record(self, djvu_path: str, page: DjVuPage) -> dict:
-        """Helper to create a single dictionary record for the LOD."""
-        filename_stem = Path(djvu_path).name
+    def get_backlink(self) -> str:
+        """
+        Get the url quoted backlink parameter for the page view links.
+
+        Returns:
+            str: the backlink parameter or an empty string if there is no new wiki image
+        """
+        backlink = ""
+        if self.djvu_bundle and self.djvu_bundle.description_url_new:
+            image_url = self.djvu_bundle.description_url_new
+            backlink = f"&backlink={urllib.parse.quote(image_url)}"
+        return backlink
+
+    def create_page_record(
+        self,
+        page: DjVuPage,
+        filename: str,
+        stem: str,
+        base_url: str,
+        backlink: str = "",
+    ) -> dict:
+        """
+        Helper to create a single dictionary record for the LOD.
 
+        Args:
+            page: the page to create the record for
+            filename: basename of the DjVu file the page belongs to
+            stem: filename without extension
+            base_url: url prefix of the djvu routes
+            backlink: precomputed backlink parameter see get_backlink
+        """
+        page_index = page.page_index
+        # the stem is the same for all pages - avoid the path parsing of page.png_file
+        png_file = DjVuPage.png_filename(stem, page_index)
         record = {
-            "#": page.page_index,
-            "Page": page.page_index,
+            "#": page_index,
+            "Page": page_index,
             "Filename": page.path or "—",
             "Valid": "✅" if page.valid else "❌",
             "Dimensions": (
@@ -243,27 +334,41 @@ class DjVuDebug:
             "DPI": page.dpi or "—",
             "Size": f"{page.filesize:,}" if page.filesize else "—",
             "Error": page.error_msg or "",
-        }
-
-        # Add Links if config exists
-        if hasattr(self, "config") and hasattr(self.config, "url_prefix"):
-            base_url = f"{self.config.url_prefix}/djvu"
-            backlink = ""
             # View Link
-            if self.djvu_bundle and self.djvu_bundle.description_url_new:
-                image_url = self.djvu_bundle.description_url_new
-                backlink = f"&backlink={urllib.parse.quote(image_url)}"
-            view_url = f"{base_url}/{filename_stem}?page={page.page_index}{backlink}"
-            record["view"] = Link.create(url=view_url, text="view")
-
+            "view": Link.create(
+                url=f"{base_url}/{filename}?page={page_index}{backlink}", text="view"
+            ),
             # PNG Download Link
             # Logic assumes content is served under content/{stem}/{png_file}
-            stem_only = Path(filename_stem).stem
-            png_url = f"{base_url}/content/{stem_only}/{page.png_file}"
-            record["png"] = Link.create(url=png_url, text="png")
-
+            "png": Link.create(url=f"{base_url}/content/{stem}/{png_file}", text="png"),
+        }
         return record
 
+    def get_page_records(
+        self, pages: List[DjVuPage], path: str, backlink: str = ""
+    ) -> list:
+        """
+        Get the view records for the given pages of a DjVu file.
+
+        Args:
+            pages: the pages to create records for
+            path: the path of the DjVu file the pages belong to
+            backlink: precomputed backlink parameter see get_backlink
+
+        Returns:
+            list: the page records
+        """
+        # urls and names are the same for all pages
+        base_url = f"{self.config.url_prefix}/djvu"
+        filename = os.path.basename(path)
+        stem = os.path.splitext(filename)[0]
+        create_page_record = self.create_page_record
+        page_records = [
+            create_page_record(page, filename, stem, base_url, backlink)
+            for page in pages
+        ]
+        return page_records
+
     def get_view_lod(self) -> list:
         """
         Convert page records into a List of Dicts by iterating over abstract sources.
@@ -272,13 +377,110 @@ class DjVuDebug:
         if not self.djvu_file:
             return []
 
-        for page in self.djvu_file.pages:
-            record = self.create_page_record(self.djvu_file.path, page)
-            view_lod.append(record)
-            self.total_pages += 1
-
+        djvu_file = self.djvu_file
+        backlink = self.get_backlink()
+        # the records only depend on the file, the url prefix and the backlink
+        # so they are reused on refresh while the (cached) DjVuFile is the same
+        signature = (self.config.url_prefix, backlink, len(djvu_file.pages))
+        view_lod_cache = self.view_lod_cache
+        if (
+            view_lod_cache is not None
+            and view_lod_cache[0] is djvu_file
+            and view_lod_cache[1] == signature
+        ):
+            view_lod = list(view_lod_cache[2])
+        else:
+            view_lod = self.get_page_records(djvu_file.pages, djvu_file.path, backlink)
+            self.view_lod_cache = (djvu_file, signature, tuple(view_lod))
+        self.total_pages = len(view_lod)
         return view_lod
 
+    def on_page_loaded(self, page: DjVuPage):
+        """
+        Collect a page reported by the loader thread for the next grid flush.
+
+        Args:
+            page: the page whose metadata has just been loaded
+        """
+        self.streamed_pages.append(page)
+
+    def flush_streamed_pages(self):
+        """
+        Show the pages loaded since the last flush in the grid - called by the
+        stream timer so that many pages cause only one grid update per interval.
+        """
+        pages = self.streamed_pages
+        shown = self.flushed_pages
+        if len(pages) > shown:
+            records = self.get_page_records(pages[shown:], pages[0].djvu_path)
+            if shown == 0:
+                self.content_row.clear()
+                with self.content_row:
+                    self.lod_grid = ListOfDictsGrid(config=self.get_grid_config())
+                    self.lod_grid.load_lod(records)
+            else:
+                self.lod_grid.lod.extend(records)
+                self.lod_grid.update()
+            self.flushed_pages += len(records)
+
+    def get_grid_config(self) -> GridConfig:
+        """
+        Get the grid configuration - ag-grid only renders the visible rows
+        plus a small buffer so large documents do not create a DOM row per page.
+
+        Returns:
+            GridConfig: Configuration for the ListOfDictsGrid
+        """
+        grid_config = GridConfig(
+            options={
+                "rowBuffer": 20,
+                "suppressColumnVirtualisation": False,
+            },
+        )
+        return grid_config
+
+    def get_content_key(self) -> Optional[tuple]:
+        """
+        Get a key for the state of the loaded DjVu file - if it does not
+        change between loads the rendered header and grid are still valid.
+
+        Returns:
+            Optional[tuple]: the content key or None if no file is loaded
+        """
+        content_key = None
+        if self.djvu_file:
+            content_key = (
+                self.djvu_file.filesize,
+                self.djvu_file.iso_date,
+                self.djvu_file.page_count,
+                len(self.djvu_file.pages),
+            )
+        return content_key
+
+    def render_content(self):
+        """
+        Render the header, bundle state and page grid for the loaded DjVu file.
+        """
+        # Convert pages to view format
+        self.view_lod = self.get_view_lod()
+
+        # Clear and update UI
+        self.content_row.clear()
+        # side by side cards are updated in place
+        self.setup_djvu_info()
+        self.update_bundle_state()
+
+        with self.content_row:
+            if self.view_lod:
+                # Grid
+                self.lod_grid = ListOfDictsGrid(config=self.get_grid_config())
+                self.lod_grid.load_lod(self.view_lod)
+            else:
+                ui.notify("No pages")
+
+        if self.lod_grid:
+            self.lod_grid.sizeColumnsToFit()
+
     async def load_debug_info(self):
         """Load DjVu file metadata and display it."""
         try:
@@ -288,48 +490,44 @@ class DjVuDebug:
                 self.progressbar.set_description("Loading DjVu file")
 
             self.progress_row.visible = True
+            # show the pages in the grid as they are loaded
+            self.streamed_pages = []
+            self.flushed_pages = 0
+            self.stream_timer.active = True
             # Load file metadata (blocking IO)
             try:
                 self.djvu_bundle = await run.io_bound(
-                    self.context.load_djvu_file, self.page_title, self.progressbar
+                    self.context.load_djvu_file,
+                    self.page_title,
+                    self.progressbar,
+                    page_callback=self.on_page_loaded,
                 )
 
                 # Extract djvu_file for convenience
                 self.djvu_file = self.djvu_bundle.djvu_file
             except Exception as e:
                 error_msg = str(e)
+                self.last_content_key = None
                 self.content_row.clear()
                 with self.content_row:
                     ui.notify(error_msg, type="negative")
                     ui.label(error_msg).classes("text-negative")
                 return
+            finally:
+                self.stream_timer.active = False
             self.progress_row.visible = False
-            # Convert pages to view format
-            self.view_lod = self.get_view_lod()
-
-            # Clear and update UI
-            self.content_row.clear()
-            # side by side
-            with self.card_row:
-                with ui.splitter() as splitter:
-                    with splitter.before:
-                        self.setup_djvu_info()
-                    with splitter.after:
-                        with ui.element("div").classes(
-                            "w-full"
-                        ) as self.bundle_state_container:
-                            self.update_bundle_state()
-
-            with self.content_row:
-                if self.view_lod:
-                    # Grid
-                    self.lod_grid = ListOfDictsGrid()
-                    self.lod_grid.load_lod(self.view_lod)
-                else:
-                    ui.notify("No pages")
-
-            if self.lod_grid:
-                self.lod_grid.sizeColumnsToFit()
+            # the streamed preview grid has no backlinks - always rebuild after it
+            if self.streamed_pages:
+                self.last_content_key = None
+            # skip the rebuild if the file did not change since the last render
+            content_key = self.get_content_key()
+            if content_key != self.last_content_key:
+                # the script generation runs djvudump - keep it off the event loop
+                await run.io_bound(
+                    self.djvu_bundle.get_bundling_script, self.update_index_db
+                )
+                self.render_content()
+                self.last_content_key = content_key
 
             with self.solution.container:
                 self.content_row.update()
@@ -337,6 +535,7 @@ class DjVuDebug:
 
         except Exception as ex:
             self.solution.handle_exception(ex)
+            self.last_content_key = None
             self.content_row.clear()
             with self.content_row:
                 ui.notify(f"Error loading DjVu file: {str(ex)}", type="negative")
@@ -379,18 +578,28 @@ class DjVuDebug:
         """Run bundling activities in background."""
         try:
             self.djvu_bundle.use_sudo = self.use_sudo
+            loop = asyncio.get_running_loop()
 
             # Use TaskRunner for progress/errors
-            def on_progress(msg: str):
+            def show_progress(msg: str):
                 with self.content_row:
                     ui.notify(msg)
 
-            def on_error(msg: str):
+            def show_error(msg: str):
                 with self.content_row:
                     with ui.card().classes("w-full bg-red-50"):
                         ui.label(msg).classes("text-negative")
 
-            success = self.djvu_bundle.bundle(
+            # the bundling runs in a worker thread - hand the messages to the event loop
+            def on_progress(msg: str):
+                loop.call_soon_threadsafe(show_progress, msg)
+
+            def on_error(msg: str):
+                loop.call_soon_threadsafe(show_error, msg)
+
+            # backup zip creation and bundling do heavy file IO
+            success = await run.io_bound(
+                self.djvu_bundle.bundle,
                 create_backup=self.create_package,
                 update_wiki=self.update_wiki,
                 update_index_db=self.update_index_db,
@@ -398,7 +607,7 @@ class DjVuDebug:
                 on_error=on_error,
             )
             msg = "✅ Bundling done" if success else "❌ Bundling failed"
-            on_progress(msg)
+            show_progress(msg)
 
             self.update_bundle_state()
 
@@ -417,11 +626,8 @@ class DjVuDebug:
         # Cancel any running task using TaskRunner
         self.task_runner.cancel_running()
 
-        # Show loading spinner
-        self.show_spinner()
-
-        # Run reload task asynchronously
-        self.task_runner.run(self.reload_debug_info)
+        # Run reload task asynchronously - shows the progress while loading
+        self.reload_debug_info()
 
     def setup_ui(self):
         """Set up the user interface components for the DjVu debug page."""
@@ -463,9 +669,18 @@ class DjVuDebug:
             )
             # attach to the task_runner
             self.task_runner.progress = self.progressbar
+            # flush streamed pages to the grid in batches while loading
+            self.stream_timer = ui.timer(0.1, self.flush_streamed_pages, active=False)
             self.progress_row.visible = False
         # side by side cards for bundle infos left: djvu right: state
-        self.card_row = ui.row().classes("w-full")
+        with ui.row().classes("w-full") as self.card_row:
+            with ui.splitter() as splitter:
+                with splitter.before:
+                    self.header_html_element = ui.html("").bind_content_from(
+                        self, "header_html"
+                    )
+                with splitter.after:
+                    self.bundle_state_container = ui.element("div").classes("w-full")
         # Content row for all content
         self.content_row = ui.row()
 
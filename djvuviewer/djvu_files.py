@@ -4,9 +4,12 @@ Created on 2026-01-05
 @author: wf
 """
 
+import json
 import os
-from dataclasses import asdict
-from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict, defaultdict
+from dataclasses import fields
+from operator import attrgetter
+from typing import Any, Dict, Generator, List, Optional, Tuple
 
 from lodstorage.lod import LOD
 from ngwidgets.progress import Progressbar
@@ -16,7 +19,7 @@ from djvuviewer.djvu_config import DjVuConfig
 from djvuviewer.djvu_core import DjVu, DjVuFile, DjVuPage
 from djvuviewer.djvu_manager import DjVuManager
 from djvuviewer.djvu_wikimages import DjVuImagesCache, DjVuMediaWikiImages
-from djvuviewer.wiki_images import MediaWikiImage
+from djvuviewer.wiki_images import MediaWikiImage, MediaWikiImages
 
 
 class DjVuFiles:
@@ -24,6 +27,11 @@ class DjVuFiles:
     Handler for a list of DjVu Files from various MediaWiki sources.
     """
 
+    # database record columns - the pages of a DjVuFile are stored separately
+    DJVU_RECORD_FIELDS = tuple(f.name for f in fields(DjVuFile) if f.name != "pages")
+    PAGE_RECORD_FIELDS = tuple(f.name for f in fields(DjVuPage))
+    MW_CLIENT_CACHE_SIZE = 128
+
     def __init__(self, config: DjVuConfig):
         """
         Initialize the DjvuFiles handler.
@@ -43,8 +51,15 @@ class DjVuFiles:
         # cache for images by filename
         self.images_by_filename: Dict[str, Dict[str, MediaWikiImage]] = {}
 
-        # Client instances: {name_or_url: DjVuMediaWikiImages}
-        self.mw_clients: Dict[str, DjVuMediaWikiImages] = {}
+        # the DjVu files segregated at ingest: {name_or_url: {relpath: DjVuFile}}
+        self.djvu_files_by_relpath: Dict[str, Dict[str, DjVuFile]] = {}
+        # reverse index of DjVu files: {relpath: {name_or_url: DjVuFile}}
+        self.djvu_by_path: Dict[str, Dict[str, DjVuFile]] = defaultdict(dict)
+
+        # least recently used client instances: {name_or_url: MediaWikiImages}
+        self.mw_clients: OrderedDict = OrderedDict()
+        # connection pool shared by all clients to avoid repeated handshakes
+        self.http_session = DjVuMediaWikiImages.get_pooled_session()
 
         # Cache instances: {name_or_url: DjVuImagesCache}
         self.caches: Dict[str, DjVuImagesCache] = {}
@@ -165,49 +180,75 @@ class DjVuFiles:
                 "all_djvu", param_dict={"limit": file_limit}
             )
         else:
-            djvu_file_records = []
-            for path in paths:
-                single_djvu_file_records = self.dvm.query(
-                    "djvu_for_path", param_dict={"path": path}
-                )
-                for record in single_djvu_file_records:
-                    djvu_file_records.append(record)
+            # one query for all paths instead of one per path
+            djvu_file_records = self.dvm.query(
+                "djvu_for_paths", param_dict={"paths": json.dumps(paths)}
+            )
 
         if page_limit is None and file_limit is None:
             djvu_page_records = self.dvm.query(
                 "all_pages", param_dict={"limit": 10000000}
             )
-        for djvu_file_record in djvu_file_records:
-            djvu_file = DjVuFile.from_dict(djvu_file_record)  # @UndefinedVariable
-            self.djvu_files_by_path[djvu_file.path] = djvu_file
-            if file_limit is not None:  # query pages per file mode
-                if page_limit is None:
-                    page_limit = 10000
-                if page_limit > 0:
-                    djvu_page_records = self.dvm.query(
-                        "pages_of_djvu",
-                        param_dict={"djvu_path": djvu_file.path, "limit": page_limit},
-                    )
-                    for djvu_page_record in djvu_page_records:
-                        djvu_page = DjVuPage.from_dict(  # @UndefinedVariable
-                            djvu_page_record
-                        )
-                        djvu_file.pages.append(djvu_page)
-            if progressbar:
-                progressbar.update(1)
+        # bind the hot loop lookups once
+        file_from_record = DjVuFile.from_record
+        files_by_path = self.djvu_files_by_path
+        djvu_files = [
+            file_from_record(djvu_file_record) for djvu_file_record in djvu_file_records
+        ]
+        for djvu_file in djvu_files:
+            files_by_path[djvu_file.path] = djvu_file
+        if file_limit is not None:  # query pages per file mode
+            if page_limit is None:
+                page_limit = 10000
+            if page_limit > 0 and djvu_files:
+                # one query for the pages of all files - limited per file
+                djvu_page_records = self.dvm.query(
+                    "pages_of_djvus",
+                    param_dict={
+                        "djvu_paths": json.dumps(
+                            [djvu_file.path for djvu_file in djvu_files]
+                        ),
+                        "limit": page_limit,
+                    },
+                )
+                self.attach_pages(djvu_files, djvu_page_records)
+        if progressbar:
+            progressbar.update(len(djvu_files))
 
         if file_limit is None:  # all mode
-            for djvu_page_record in djvu_page_records:
-                djvu_page = DjVuPage.from_dict(djvu_page_record)  # @UndefinedVariable
-                djvu_file = self.djvu_files_by_path.get(djvu_page.djvu_path, None)
-                if djvu_file is None:
-                    self.errors.append(
-                        f"djvu_file {djvu_page.djvu_path} missing for page {djvu_page.page_index}"
+            pages_by_path = self.attach_pages(djvu_files, djvu_page_records)
+            errors_append = self.errors.append
+            # pages whose file is not known
+            for djvu_path in pages_by_path.keys() - files_by_path.keys():
+                for djvu_page in pages_by_path[djvu_path]:
+                    errors_append(
+                        f"djvu_file {djvu_path} missing for page {djvu_page.page_index}"
                     )
-                else:
-                    djvu_file.pages.append(djvu_page)
         return self.djvu_files_by_path
 
+    def attach_pages(
+        self, djvu_files: List[DjVuFile], djvu_page_records: List[Dict[str, Any]]
+    ) -> Dict[str, List[DjVuPage]]:
+        """
+        Group the given page records by their djvu_path in a single pass
+        and attach the pages to the given files.
+
+        Args:
+            djvu_files: the files to attach the pages to
+            djvu_page_records: the page records e.g. from the pages_of_djvus query
+
+        Returns:
+            Dict[str, List[DjVuPage]]: the pages grouped by djvu_path
+        """
+        pages_by_path = defaultdict(list)
+        page_from_record = DjVuPage.from_record
+        for djvu_page_record in djvu_page_records:
+            djvu_page = page_from_record(djvu_page_record)
+            pages_by_path[djvu_page.djvu_path].append(djvu_page)
+        for djvu_file in djvu_files:
+            djvu_file.pages.extend(pages_by_path.get(djvu_file.path, []))
+        return pages_by_path
+
     def add_to_cache(
         self, key: str, images: List[MediaWikiImage], replace: bool = False
     ):
@@ -221,35 +262,51 @@ class DjVuFiles:
             replace: If True, replace existing images with same relpath.
                     If False, append new images.
         """
-        # Ensure list exists
-        if key not in self.images:
-            self.images[key] = []
+        cached_images = self.images.setdefault(key, [])
 
-        if replace and self.images[key]:
+        if replace and cached_images:
             # Merge strategy implies we need a temporary map to handle overwrites
-            # 1. Map existing images by relpath
-            existing_map = {
-                img.relpath: img
-                for img in self.images[key]
-                if hasattr(img, "relpath") and img.relpath
-            }
-
-            # 2. Update map with new images (this performs the replacement)
-            for img in images:
-                if hasattr(img, "relpath") and img.relpath:
-                    existing_map[img.relpath] = img
+            # images without relpath can't be keyed and are kept as they are
+            unkeyed = []
+            existing_map = {}
+            for img in (*cached_images, *images):
+                relpath = getattr(img, "relpath", None)
+                if relpath:
+                    # later images replace earlier ones with the same relpath
+                    existing_map[relpath] = img
                 else:
-                    # If image has no relpath, we can't key it, so just append
-                    self.images[key].append(img)
-
-            # 3. Write back values
-            self.images[key] = list(existing_map.values())
+                    unkeyed.append(img)
+            self.images[key] = [*existing_map.values(), *unkeyed]
+            # Rebuild all lookups (relpath and filename)
+            self.refresh_lookups(key)
         else:
-            # Append mode
-            self.images[key].extend(images)
+            # Append mode - merge the new images into the lookups
+            cached_images.extend(images)
+            self.merge_lookups(key, images)
+
+    def merge_lookups(self, key: str, images: List[MediaWikiImage]):
+        """
+        Merge the given newly appended images into the auxiliary
+        indices (relpath, filename) of a specific cache key with the
+        same first one wins semantics as a rebuild via refresh_lookups.
 
-        # Rebuild all lookups (relpath and filename) securely
-        self.refresh_lookups(key)
+        Args:
+            key: Cache key (usually wiki name or URL)
+            images: the images that have been appended to the cache
+        """
+        relpath_lookup = self.images_by_relpath.setdefault(key, {})
+        filename_lookup = self.images_by_filename.setdefault(key, {})
+        djvu_lookup = self.djvu_files_by_relpath.setdefault(key, {})
+        for img in images:
+            relpath = getattr(img, "relpath", None)
+            if relpath is not None and relpath not in relpath_lookup:
+                relpath_lookup[relpath] = img
+                if isinstance(img, DjVuFile):
+                    djvu_lookup[relpath] = img
+                    self.djvu_by_path[relpath][key] = img
+            filename = getattr(img, "filename", None)
+            if filename is not None:
+                filename_lookup.setdefault(filename, img)
 
     def refresh_lookups(self, key: str):
         """
@@ -261,9 +318,22 @@ class DjVuFiles:
 
         img_list = self.images[key]
 
+        # remove the reverse index entries of the previous lookup
+        for relpath in self.djvu_files_by_relpath.get(key, {}):
+            self.djvu_by_path[relpath].pop(key, None)
+
         # 1. Primary Lookup: Relpath
         # generic getLookup returns (lookup_dict, list_of_duplicates). We only need the dict.
         self.images_by_relpath[key], _ = LOD.getLookup(img_list, "relpath")
+        # segregate the DjVu files once at ingest
+        djvu_lookup = {
+            relpath: img
+            for relpath, img in self.images_by_relpath[key].items()
+            if isinstance(img, DjVuFile)
+        }
+        self.djvu_files_by_relpath[key] = djvu_lookup
+        for relpath, djvu_file in djvu_lookup.items():
+            self.djvu_by_path[relpath][key] = djvu_file
 
         # 2. Secondary Lookup: Filename (New requirement)
         self.images_by_filename[key], _ = LOD.getLookup(img_list, "filename")
@@ -296,8 +366,7 @@ class DjVuFiles:
                 If titles is specified, returns only those newly fetched images.
                 Otherwise returns all images from the cache.
         """
-        # Use name as cache key if provided, otherwise use URL
-        key = name if name else url
+        key = self.get_key(url, name)
 
         # Determine cache freshness: 0 days = force refresh, 1 day = use cache if fresh
         freshness_days = 0 if refresh else 1
@@ -306,10 +375,12 @@ class DjVuFiles:
         cache = DjVuImagesCache.from_cache(
             config=self.config,
             url=url,
-            name=name or key,
+            name=key,
             limit=limit,
             freshness_days=freshness_days,
             progressbar=progressbar,
+            # the ui does not wait for a daily refresh
+            stale_while_revalidate=True,
         )
 
         # Store cache for future access
@@ -317,18 +388,16 @@ class DjVuFiles:
 
         # Handle specific titles if requested
         if titles:
-            current_images = []
-
             # Create title-indexed mapping for O(1) replacement instead of O(n) list searches
             images_dict = {img.title: img for img in cache.images}
 
-            # Fetch detailed metadata for each requested title
-            for title in titles:
-                img = cache.mw_client.fetch_image(title)
-                if img:
-                    current_images.append(img)
-                    # Per-title fetches typically include more detailed metadata than bulk operations
-                    images_dict[title] = img
+            # Fetch detailed metadata for the requested titles in bulk requests
+            # imageinfo typically includes more detailed metadata than allimages
+            current_images = cache.mw_client.fetch_images_by_titles(
+                titles, max_workers=self.config.fetch_concurrency
+            )
+            for img in current_images:
+                images_dict[img.title] = img
 
             # Update cache with merged image data
             cache.images = list(images_dict.values())
@@ -345,25 +414,55 @@ class DjVuFiles:
         # Return all images from cache
         return cache.images
 
-    def get_client(self, url: str, name: Optional[str] = None) -> DjVuMediaWikiImages:
+    def get_key(self, url: str, name: Optional[str] = None) -> str:
         """
-        Get or create a MediaWiki client for the given URL/name.
+        Get the cache key for the given wiki - the name if provided
+        otherwise the URL.
 
         Args:
             url: The MediaWiki base URL
             name: Optional short alias for this wiki instance
 
         Returns:
-            DjVuMediaWikiImages: The client instance
+            str: the key for the caches and clients
         """
-        key = name if name else url
+        key = name or url
+        return key
 
-        if key not in self.mw_clients:
-            self.mw_clients[key] = DjVuMediaWikiImages(
-                config=self.config, url=url, name=name
-            )
+    def get_client(self, url: str, name: Optional[str] = None) -> MediaWikiImages:
+        """
+        Get or create a MediaWiki client for the given URL/name.
+
+        The clients are kept in a least recently used cache of
+        MW_CLIENT_CACHE_SIZE entries - the client of an already fetched
+        images cache is reused.
+
+        Args:
+            url: The MediaWiki base URL
+            name: Optional short alias for this wiki instance
+
+        Returns:
+            MediaWikiImages: The client instance
+        """
+        key = self.get_key(url, name)
+
+        # a single dict lookup on the common hit path
+        client = self.mw_clients.get(key)
+        if client is None:
+            cache = self.caches.get(key)
+            if cache is not None and cache.url == url:
+                client = cache.mw_client
+            else:
+                client = DjVuMediaWikiImages.get_mediawiki_images_client(
+                    url, session=self.http_session
+                )
+            self.mw_clients[key] = client
+            while len(self.mw_clients) > self.MW_CLIENT_CACHE_SIZE:
+                self.mw_clients.popitem(last=False)
+        else:
+            self.mw_clients.move_to_end(key)
 
-        return self.mw_clients[key]
+        return client
 
     def lookup_djvu_file_by_path(self, path: str) -> Dict[str, DjVuFile]:
         """
@@ -376,32 +475,38 @@ class DjVuFiles:
             Dictionary mapping source names to DjVuFile objects for all sources
             that have a file at this path. Empty dict if not found in any source.
         """
-        results = {}
-        for source, images_dict in self.images_by_relpath.items():
-            if path in images_dict:
-                img = images_dict[path]
-                if isinstance(img, DjVuFile):
-                    results[source] = img
+        results = dict(self.djvu_by_path.get(path, {}))
         return results
 
-    def store(
-        self,
-        djvu_files: List[DjVuFile],
-        sample_record_count: int = 1,
-    ) -> None:
+    def store(self, djvu_files: List[DjVuFile]) -> None:
         """
         Store DjVu files and their pages in the database.
 
+        The rows are generated lazily as value tuples and stored in a
+        single transaction so that no record dicts are held in memory.
+
         Args:
             djvu_files: List of DjVuFile objects to store
-            sample_record_count: Number of sample records for schema inference
         """
-        djvu_lod, page_lod = self.get_db_records(djvu_files)
-        self.store_lods(djvu_lod, page_lod, sample_record_count)
+        get_djvu_values = attrgetter(*DjVuFiles.DJVU_RECORD_FIELDS)
+        self.dvm.store_many(
+            [
+                (
+                    "Page",
+                    DjVuFiles.PAGE_RECORD_FIELDS,
+                    self.yield_page_rows(djvu_files),
+                ),
+                (
+                    "DjVu",
+                    DjVuFiles.DJVU_RECORD_FIELDS,
+                    map(get_djvu_values, djvu_files),
+                ),
+            ]
+        )
 
     def store_lods(
         self,
-        djvu_lod: List[Dict[str, Any]],
+        djvu_lod: Optional[List[Dict[str, Any]]],
         page_lod: Optional[List[Dict[str, Any]]] = None,
         sample_record_count: int = 1,
         with_drop: bool = False,
@@ -410,7 +515,7 @@ class DjVuFiles:
         Store DjVu and page records in the database.
 
         Args:
-            djvu_lod: List of DjVu file records
+            djvu_lod: List of DjVu file records - if None do not store
             page_lod: List of page records - if None do not store
             sample_record_count: Number of sample records for schema inference
             with_drop: If True, drop existing tables before creating new ones
@@ -423,14 +528,69 @@ class DjVuFiles:
                 with_drop=with_drop,
                 sampleRecordCount=sample_record_count,
             )
-        self.dvm.store(
-            lod=djvu_lod,
-            entity_name="DjVu",
-            primary_key="path",
-            with_drop=with_drop,
-            sampleRecordCount=sample_record_count,
-        )
-        pass
+        if djvu_lod:
+            self.dvm.store(
+                lod=djvu_lod,
+                entity_name="DjVu",
+                primary_key="path",
+                with_drop=with_drop,
+                sampleRecordCount=sample_record_count,
+            )
+
+    def get_djvu_records(self, djvu_files: List[DjVuFile]) -> List[Dict[str, Any]]:
+        """
+        Convert DjVuFile objects to database records without their pages.
+
+        Args:
+            djvu_files: List of DjVuFile objects to convert
+
+        Returns:
+            List of DjVu file records
+        """
+        # the records are flat - read the field values directly instead of
+        # the recursive deep copy of asdict
+        djvu_fields = DjVuFiles.DJVU_RECORD_FIELDS
+        get_djvu_values = attrgetter(*djvu_fields)
+        djvu_lod = [
+            dict(zip(djvu_fields, get_djvu_values(djvu_file)))
+            for djvu_file in djvu_files
+        ]
+        return djvu_lod
+
+    def yield_page_records(
+        self, djvu_files: List[DjVuFile]
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        Generate the page database records of the given DjVuFile objects.
+
+        Args:
+            djvu_files: List of DjVuFile objects whose pages to convert
+
+        Yields:
+            Dict[str, Any]: a page record
+        """
+        page_fields = DjVuFiles.PAGE_RECORD_FIELDS
+        get_page_values = attrgetter(*page_fields)
+        for djvu_file in djvu_files:
+            for page in djvu_file.pages:
+                yield dict(zip(page_fields, get_page_values(page)))
+
+    def yield_page_rows(
+        self, djvu_files: List[DjVuFile]
+    ) -> Generator[Tuple, None, None]:
+        """
+        Generate the page database rows of the given DjVuFile objects
+        as value tuples in the order of PAGE_RECORD_FIELDS.
+
+        Args:
+            djvu_files: List of DjVuFile objects whose pages to convert
+
+        Yields:
+            Tuple: the column values of a page
+        """
+        get_page_values = attrgetter(*DjVuFiles.PAGE_RECORD_FIELDS)
+        for djvu_file in djvu_files:
+            yield from map(get_page_values, djvu_file.pages)
 
     def get_db_records(
         self,
@@ -447,22 +607,8 @@ class DjVuFiles:
                 - djvu_lod: List of DjVu file records (without pages)
                 - page_lod: List of page records from all files
         """
-        djvu_lod = []
-        page_lod = []
-
-        for djvu_file in djvu_files:
-            # Convert DjVuFile to dict
-            djvu_record = asdict(djvu_file)
-
-            # Remove pages from djvu record (they're stored separately)
-            djvu_record.pop("pages", None)
-            djvu_lod.append(djvu_record)
-
-            # Extract all page records
-            for page in djvu_file.pages:
-                page_record = asdict(page)
-                page_lod.append(page_record)
-
+        djvu_lod = self.get_djvu_records(djvu_files)
+        page_lod = list(self.yield_page_records(djvu_files))
         return djvu_lod, page_lod
 
     def init_database(self) -> None:
@@ -471,10 +617,11 @@ class DjVuFiles:
 
         Creates the database schema using sample DjVu and page records.
         """
-        djvu_record = asdict(DjVu.get_sample())
-        djvu_lod = [djvu_record]
-        page_record = asdict(DjVuPage.get_sample())
-        page_lod = [page_record]
+        # the sample records are flat - no asdict deep copy needed
+        djvu_lod = self.get_djvu_records([DjVu.get_sample()])
+        page_fields = DjVuFiles.PAGE_RECORD_FIELDS
+        page_values = attrgetter(*page_fields)(DjVuPage.get_sample())
+        page_lod = [dict(zip(page_fields, page_values))]
         self.store_lods(djvu_lod, page_lod, sample_record_count=1, with_drop=True)
 
     def get_diff(self, name_a: str, name_b: str) -> List[MediaWikiImage]:
@@ -496,12 +643,10 @@ class DjVuFiles:
         map_b = self.images_by_relpath[name_b]
 
         # Symmetric difference: elements in either set but not in both
-        diff_keys = map_a.keys() ^ map_b.keys()
-
-        # Collect image objects from whichever source contains them
-        diff_objs = []
-        for k in diff_keys:
-            obj = map_a[k] if k in map_a else map_b[k]
-            diff_objs.append(obj)
+        only_a = map_a.keys() - map_b.keys()
+        only_b = map_b.keys() - map_a.keys()
 
-        return sorted(diff_objs, key=lambda x: x.relpath)
+        # Collect image objects from the source that contains them
+        diff_objs = [*map(map_a.__getitem__, only_a), *map(map_b.__getitem__, only_b)]
+        diff_objs.sort(key=attrgetter("relpath"))
+        return diff_objs
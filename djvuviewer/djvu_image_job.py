@@ -7,6 +7,7 @@ Created on 2026-01-03
 import logging
 import os
 from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Optional, Tuple
 
 import djvu
@@ -15,7 +16,7 @@ from basemkit.profiler import Profiler
 from djvuviewer.djvu_core import BaseFile, DjVuImage
 
 
-@dataclass
+@dataclass(slots=True)
 class ImageJob(BaseFile):
     """
     Represents a processed DjVu page,
@@ -27,23 +28,26 @@ class ImageJob(BaseFile):
     page: djvu.decode.Page
     page_index: int  # page_index to track position
     relurl: str  # relurl for context
+    doc_prefix: Optional[str] = field(default=None, repr=False)  # shared per document
     pagejob: Optional[djvu.decode.PageJob] = field(default=None)
     image: Optional[DjVuImage] = field(default=None)
     # flags
     verbose: bool = False
     debug: bool = False
     error: Optional[Exception] = field(default=None)
+    profiler: Optional[Profiler] = field(default=None, init=False, repr=False)
 
     def __post_init__(self):
-        """Initialize profiler if not provided"""
-        self.profiler = Profiler(
-            f"Image Job {self.relurl}#{self.page_index:04d}",
-            profile=self.verbose or self.debug,
-        )
-        self.profiler.start()
+        """Initialize profiler only if verbose or debug output is requested"""
+        if self.verbose or self.debug:
+            self.profiler = Profiler(
+                f"Image Job {self.relurl}#{self.page_index:04d}",
+                profile=True,
+            )
+            self.profiler.start()
 
     def log(self, msg):
-        if self.verbose or self.debug:
+        if self.profiler is not None:
             self.profiler.time(" " + msg)
 
     def get_size(self) -> Tuple[int, int]:
@@ -67,18 +71,20 @@ class ImageJob(BaseFile):
             image_rel_dir = image_rel_dir.lstrip(os.sep)
         return image_rel_dir
 
-    @property
+    @cached_property
     def prefix(self) -> str:
-        prefix = ImageJob.get_prefix(relurl=self.relurl)
+        prefix = self.doc_prefix
+        if prefix is None:
+            prefix = ImageJob.get_prefix(relurl=self.relurl)
         return prefix
 
-    @property
+    @cached_property
     def decoded_filename(self) -> str:
         try:
-            # Attempt to safely decode the file name
-            filename = self.page.file.name.encode("utf-8", errors="replace").decode(
-                "utf-8"
-            )
+            filename = self.page.file.name
+            # ascii names are safe - only sanitize others e.g. with lone surrogates
+            if not filename.isascii():
+                filename = filename.encode("utf-8", errors="replace").decode("utf-8")
         except Exception as e:
             if self.debug:
                 logging.warn(
@@ -87,12 +93,12 @@ class ImageJob(BaseFile):
             filename = f"page_{self.page_index:04d}.djvu"
         return filename
 
-    @property
+    @cached_property
     def dirname(self) -> str:
         dirname = os.path.dirname(self.djvu_path)
         return dirname
 
-    @property
+    @cached_property
     def filepath(self) -> str:
         filepath = os.path.join(self.dirname, self.decoded_filename)
         return filepath
@@ -4,11 +4,15 @@ Created on 2025-02-24
 @author: wf
 """
 
+import json
+from typing import Iterable, List, Optional, Tuple
+
 from basemkit.profiler import Profiler
-from lodstorage.multilang_querymanager import MultiLanguageQueryManager
+from lodstorage.lod import LOD
 from lodstorage.sql import SQLDB
 
 from djvuviewer.djvu_config import DjVuConfig
+from djvuviewer.query_cache import QueryCache
 
 
 class DjVuManager:
@@ -25,11 +29,16 @@ class DjVuManager:
            config:DjVuConfig - the DjVu configuration to use
         """
         self.config = config
-        self.mlqm = MultiLanguageQueryManager(
-            yaml_path=self.config.queries_path,
-            endpoints_path=self.config.endpoints_path,
-        )
-        self.sql_db = SQLDB(self.config.db_path, check_same_thread=False)
+        # query lookup only - the queries run on my own sql_db
+        self.mlqm = QueryCache.get_mlqm(self.config.queries_path)
+        # the connection is kept for the lifetime of the manager - wait for
+        # a concurrent writer instead of failing with "database is locked"
+        self.sql_db = SQLDB(self.config.db_path, check_same_thread=False, timeout=30)
+        if self.config.wal_mode:
+            # readers (e.g. the viewer) do not block on the index writer and vice versa
+            self.sql_db.c.execute("PRAGMA journal_mode=WAL")
+        # fewer fsyncs per commit - the bulk stores are rebuildable from the sources
+        self.sql_db.c.execute("PRAGMA synchronous=NORMAL")
 
     def query(self, query_name: str, param_dict=None):
         """
@@ -45,9 +54,7 @@ class DjVuManager:
         if param_dict is None:
             param_dict = {}
         query = self.mlqm.query4Name(query_name)
-        sql_query = query.params.apply_parameters_with_check(
-            param_dict, query.param_list
-        )
+        sql_query = QueryCache.get_sql_query(query, param_dict)
         lod = self.sql_db.query(sql_query, params=param_dict)
         return lod
 
@@ -59,6 +66,7 @@ class DjVuManager:
         with_drop: bool = False,
         profile: bool = True,
         sampleRecordCount: int = 20,
+        chunk_size: int = 5000,
     ):
         """
         Store a list of records (list of dicts) into the database.
@@ -70,28 +78,68 @@ class DjVuManager:
             with_drop: If True, the existing table (if any) is dropped before creation.
             profile: If True, logs performance information using Profiler.
             sampleRecordCount: minimum number of samples
+            chunk_size: number of records per insert to bound the parameter binding memory
         """
         profiler = Profiler(
             f"storing {len(lod)} {entity_name} records  to SQL", profile=profile
         )
-        if with_drop:
-            # @FIXME should be with_create
-            self.sql_db.execute(f"DROP TABLE IF EXISTS {entity_name}")
-        self.entity_info = self.sql_db.createTable(
-            listOfRecords=lod,
-            entityName=entity_name,
-            primaryKey=primary_key,
-            withCreate=with_drop,
-            withDrop=with_drop,
-            sampleRecordCount=sampleRecordCount,
-        )
-        self.sql_db.store(
-            listOfRecords=lod,
-            entityInfo=self.entity_info,
-            executeMany=True,
-            fixNone=True,
-            replace=True,  # avoid UNIQUE constraint errors
-        )
+        # sqlite3 runs DDL in autocommit mode - an explicit transaction
+        # makes drop, create and insert a single commit
+        if not self.sql_db.c.in_transaction:
+            self.sql_db.c.execute("BEGIN")
+        try:
+            # createTable drops and recreates the table with_drop
+            self.entity_info = self.sql_db.createTable(
+                listOfRecords=lod,
+                entityName=entity_name,
+                primaryKey=primary_key,
+                withCreate=with_drop,
+                withDrop=with_drop,
+                sampleRecordCount=sampleRecordCount,
+            )
+            # SQLDB.store commits - insert the chunks directly so that
+            # drop, create and all chunks stay one transaction
+            insert_cmd = self.entity_info.getInsertCmd(
+                replace=True  # avoid UNIQUE constraint errors
+            )
+            column_names = self.entity_info.typeMap.keys()
+            for start in range(0, len(lod), chunk_size):
+                chunk = lod[start : start + chunk_size]
+                LOD.setNone4List(chunk, column_names)
+                self.sql_db.c.executemany(insert_cmd, chunk)
+            self.sql_db.c.commit()
+        except Exception:
+            self.sql_db.c.rollback()
+            raise
+        profiler.time()
+
+    def store_many(
+        self,
+        entity_rows: List[Tuple[str, Tuple[str, ...], Iterable[Tuple]]],
+        profile: bool = True,
+    ):
+        """
+        Store the rows of several entities into their existing tables
+        in a single transaction.
+
+        In contrast to store no record dicts are needed - the value tuples
+        are bound positionally by one prepared insert per entity and the
+        rows may be generated lazily.
+
+        Args:
+            entity_rows: (entity_name, columns, rows) tuples with the rows
+                being value tuples in the order of the columns
+            profile: If True, logs performance information using Profiler.
+        """
+        entity_names = ", ".join(entity_name for entity_name, _, _ in entity_rows)
+        profiler = Profiler(f"storing {entity_names} rows to SQL", profile=profile)
+        # the connection context commits once or rolls back on error
+        with self.sql_db.c:
+            for entity_name, columns, rows in entity_rows:
+                column_list = ",".join(columns)
+                placeholders = ",".join("?" * len(columns))
+                insert_cmd = f"INSERT OR REPLACE INTO {entity_name} ({column_list}) VALUES ({placeholders})"
+                self.sql_db.c.executemany(insert_cmd, rows)
         profiler.time()
 
     def migrate_to_package_fields(
@@ -117,6 +165,12 @@ class DjVuManager:
         if new_columns is None:
             new_columns = {"filename": "TEXT"}
 
+        # skip the schema probing if this migration is already recorded
+        meta_key = f"{table_name}.package_fields"
+        meta_value = json.dumps([field_map, new_columns], sort_keys=True)
+        if self.get_schema_meta(meta_key) == meta_value:
+            return
+
         # Check if table exists
         cursor = self.sql_db.c.execute(
             "SELECT name FROM sqlite_master WHERE type='table' AND LOWER(name)=LOWER(?)",
@@ -127,31 +181,77 @@ class DjVuManager:
 
         # Check existing columns
         cursor = self.sql_db.c.execute(f"PRAGMA table_info({table_name})")
-        columns = [row[1] for row in cursor.fetchall()]
+        columns = {row[1] for row in cursor}
 
         # Check if migration needed
-        needs_rename = any(old_name in columns for old_name in field_map.keys())
-        needs_new_columns = any(
-            col_name not in columns for col_name in new_columns.keys()
-        )
+        needs_rename = not columns.isdisjoint(field_map.keys())
+        needs_new_columns = not columns.issuperset(new_columns.keys())
 
         if not needs_rename and not needs_new_columns:
-            return  # Already migrated
+            # Already migrated
+            self.set_schema_meta(meta_key, meta_value)
+            return
 
         print(f"Migrating {table_name} index table fields...")
 
-        # Rename columns
-        for old_name, new_name in field_map.items():
-            if old_name in columns:
-                self.sql_db.c.execute(
-                    f"ALTER TABLE {table_name} RENAME COLUMN {old_name} TO {new_name}"
-                )
-
-        # Add new columns
-        for col_name, col_type in new_columns.items():
-            if col_name not in columns:
-                self.sql_db.c.execute(
-                    f"ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type}"
-                )
-
-        self.sql_db.commit()
+        # all schema changes and the marker in a single write transaction
+        self.sql_db.c.execute("BEGIN IMMEDIATE")
+        try:
+            # Rename columns
+            for old_name, new_name in field_map.items():
+                if old_name in columns:
+                    self.sql_db.c.execute(
+                        f"ALTER TABLE {table_name} RENAME COLUMN {old_name} TO {new_name}"
+                    )
+
+            # Add new columns
+            for col_name, col_type in new_columns.items():
+                if col_name not in columns:
+                    self.sql_db.c.execute(
+                        f"ALTER TABLE {table_name} ADD COLUMN {col_name} {col_type}"
+                    )
+
+            # commits the transaction
+            self.set_schema_meta(meta_key, meta_value)
+        except Exception:
+            self.sql_db.c.rollback()
+            raise
+
+    def get_schema_meta(self, key: str) -> Optional[str]:
+        """
+        Get a schema metadata value e.g. a migration marker.
+
+        Args:
+            key: the metadata key
+
+        Returns:
+            the value or None if not set
+        """
+        value = None
+        # read only - the table is created by set_schema_meta
+        has_table = self.sql_db.c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_meta'"
+        ).fetchone()
+        if has_table:
+            row = self.sql_db.c.execute(
+                "SELECT value FROM schema_meta WHERE key=?", (key,)
+            ).fetchone()
+            value = row[0] if row else None
+        return value
+
+    def set_schema_meta(self, key: str, value: str):
+        """
+        Set a schema metadata value e.g. a migration marker.
+
+        Args:
+            key: the metadata key
+            value: the value to set
+        """
+        self.sql_db.c.execute(
+            "CREATE TABLE IF NOT EXISTS schema_meta(key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.sql_db.c.execute(
+            "INSERT OR REPLACE INTO schema_meta(key, value) VALUES (?, ?)",
+            (key, value),
+        )
+        self.sql_db.c.commit()
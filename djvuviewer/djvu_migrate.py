@@ -7,18 +7,33 @@ Created on 2026-02-20
 import argparse
 import logging
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from typing import List, Optional, Tuple
 
 from basemkit.base_cmd import BaseCmd
 from lodstorage.multilang_querymanager import MultiLanguageQueryManager
+from lodstorage.query import EndpointManager
+from lodstorage.sql_backend import SQLBackend, get_sql_backend
+from lodstorage.yaml_path import YamlPath
 from ngwidgets.progress import Progressbar, TqdmProgressbar
 
 from djvuviewer.djvu_config import DjVuConfig
 from djvuviewer.djvu_manager import DjVuManager
 from djvuviewer.djvu_wikimages import DjVuImagesCache
 from djvuviewer.mw_server import ServerConfig, ServerProfile
+from djvuviewer.query_cache import IndexedMultiLanguageQueryManager, QueryCache
 from djvuviewer.version import Version
 
+try:
+    from lodstorage.mysql import MySqlQuery
+
+    from djvuviewer.persistent_mysql import PersistentMySqlQuery
+except ImportError:
+    # PyMySQL is optional - the wiki queries are then not available anyway
+    MySqlQuery = None
+    PersistentMySqlQuery = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -52,6 +67,7 @@ class DjVuMigration(BaseCmd):
             test=getattr(args, "test", False)
         )
         self.progress_bar = None
+        self.wiki_backend: Optional[SQLBackend] = None
 
     def add_arguments(self, parser: ArgumentParser) -> ArgumentParser:
         """
@@ -161,23 +177,26 @@ class DjVuMigration(BaseCmd):
         """
         handled = super().handle_args(args)
         self.configure_profile(debug=args.debug)
-        if args.info:
-            self.show_info()
-            handled = True
-        if args.cache:
-            limit = args.limit if args.limit else 256
-            self.profile.index_filelists(limit=limit, with_progress=args.progress)
-            handled = True
-        if args.profile_servers:
-            self.update_profile(
-                tablefmt=args.format, write=getattr(args, "write", False)
-            )
-            handled = True
-        if args.migrate:
-            limit = getattr(args, "limit", None)
-            execute = getattr(args, "execute", False)
-            self.migrate(args.migrate, limit=limit, execute=execute)
-            handled = True
+        try:
+            if args.info:
+                self.show_info()
+                handled = True
+            if args.cache:
+                limit = args.limit if args.limit else 256
+                self.profile.index_filelists(limit=limit, with_progress=args.progress)
+                handled = True
+            if args.profile_servers:
+                self.update_profile(
+                    tablefmt=args.format, write=getattr(args, "write", False)
+                )
+                handled = True
+            if args.migrate:
+                limit = getattr(args, "limit", None)
+                execute = getattr(args, "execute", False)
+                self.migrate(args.migrate, limit=limit, execute=execute)
+                handled = True
+        finally:
+            self.close()
         return handled
 
     def update_profile(
@@ -201,6 +220,84 @@ class DjVuMigration(BaseCmd):
         if write:
             self.profile.save()
 
+    @cached_property
+    def wiki_mlqm(self) -> MultiLanguageQueryManager:
+        """
+        The query manager for the wiki queries - query lookup only,
+        the queries run on the wiki backend.
+
+        Returns:
+            MultiLanguageQueryManager for the wiki queries
+        """
+        wiki_mlqm = QueryCache.get_mlqm(self.djvu_config.wiki_queries_path)
+        return wiki_mlqm
+
+    def get_wiki_backend(self) -> SQLBackend:
+        """
+        Get the backend for the wiki MariaDB (genwiki39) - created on first use
+        and kept open until close() so that the connection is reused.
+
+        Returns:
+            SQLBackend for the configured wiki endpoint
+        """
+        wiki_backend = self.wiki_backend
+        if wiki_backend is None:
+            endpoints_path = YamlPath.getDefaultPath("endpoints.yaml")
+            em = EndpointManager.of_yaml(yaml_path=endpoints_path)
+            endpoint = em.get_endpoint(self.djvu_config.wiki_endpoint)
+            wiki_backend = get_sql_backend(endpoint)
+            if PersistentMySqlQuery is not None and isinstance(
+                wiki_backend, MySqlQuery
+            ):
+                wiki_backend = PersistentMySqlQuery(endpoint)
+            self.wiki_backend = wiki_backend
+        return wiki_backend
+
+    def query_wiki_db(
+        self, query_name: str, param_dict: Optional[dict] = None
+    ) -> List[dict]:
+        """
+        Run a named wiki query against the wiki MariaDB (genwiki39).
+
+        Args:
+            query_name: Named query defined in the wiki queries YAML.
+            param_dict: Optional parameter dict for the query.
+
+        Returns:
+            List of result dicts
+
+        Raises:
+            ValueError: if the query name is not found
+        """
+        query = self.wiki_mlqm.query4Name(query_name)
+        if query is None:
+            raise ValueError(f"Query '{query_name}' not found")
+        sql_query = QueryCache.get_sql_query(query, param_dict)
+        lod = self.get_wiki_backend().query(sql_query)
+        return lod
+
+    def close(self) -> None:
+        """
+        Close the wiki connection if one has been opened.
+        """
+        if PersistentMySqlQuery is not None and isinstance(
+            self.wiki_backend, PersistentMySqlQuery
+        ):
+            self.wiki_backend.close()
+        self.wiki_backend = None
+
+    @cached_property
+    def djvu_manager(self) -> DjVuManager:
+        """
+        The manager for the DjVu SQLite database - connected once
+        per migration instance.
+
+        Returns:
+            DjVuManager for the configured DjVu database
+        """
+        djvu_manager = DjVuManager(self.djvu_config)
+        return djvu_manager
+
     def extract_djvu(self) -> Tuple[str, Optional[List[dict]]]:
         """
         Extract all DjVu records from the DjVu SQLite database.
@@ -210,7 +307,7 @@ class DjVuMigration(BaseCmd):
         """
         lod = None
         try:
-            lod = DjVuManager(self.djvu_config).query("all_djvu", {"limit": 100000})
+            lod = self.djvu_manager.query("all_djvu", {"limit": 100000})
         except Exception as ex:
             logger.warning("djvu extract failed: %s", ex)
         return "djvu", lod
@@ -250,13 +347,7 @@ class DjVuMigration(BaseCmd):
         if not self.djvu_config.wiki_queries_path:
             return "wiki", lod
         try:
-            mlqm = MultiLanguageQueryManager(
-                yaml_path=self.djvu_config.wiki_queries_path,
-                endpoint_name=self.djvu_config.wiki_endpoint,
-                endpoints_path=None,
-                languages=["sql"],
-            )
-            lod = mlqm.query("wiki_djvu_stats")
+            lod = self.query_wiki_db("wiki_djvu_stats")
         except Exception as ex:
             logger.warning("wiki extract failed: %s", ex)
         return "wiki", lod
@@ -280,13 +371,7 @@ class DjVuMigration(BaseCmd):
         if not self.djvu_config.wiki_queries_path:
             return lod
         try:
-            mlqm = MultiLanguageQueryManager(
-                yaml_path=self.djvu_config.wiki_queries_path,
-                endpoint_name=self.djvu_config.wiki_endpoint,
-                endpoints_path=None,
-                languages=["sql"],
-            )
-            lod = mlqm.query("wiki_image_links", {"filename": filename})
+            lod = self.query_wiki_db("wiki_image_links", {"filename": filename})
         except Exception as ex:
             logger.warning("wiki_image_links failed for %s: %s", filename, ex)
         return lod
@@ -300,17 +385,18 @@ class DjVuMigration(BaseCmd):
             MultiLanguageQueryManager connected to the federation db,
             ready for named queries.
         """
-        mlqm = MultiLanguageQueryManager(
+        mlqm = IndexedMultiLanguageQueryManager(
             yaml_path=self.djvu_config.migrate_queries_path,
             endpoint_name="djvu_migrate",
             endpoints_path=self.djvu_config.endpoints_path,
             languages=["sql"],
         )
-        for table, lod in [
-            self.extract_djvu(),
-            self.extract_mw_images(),
-            self.extract_wiki(),
-        ]:
+        # the sources are independent and I/O bound - extract them concurrently
+        extractors = [self.extract_djvu, self.extract_mw_images, self.extract_wiki]
+        with ThreadPoolExecutor(max_workers=len(extractors)) as executor:
+            futures = [executor.submit(extractor) for extractor in extractors]
+            extracts = [future.result() for future in futures]
+        for table, lod in extracts:
             if lod:
                 mlqm.store_lod(lod, table, primary_key=None)
         return mlqm
@@ -10,9 +10,11 @@ import os
 import shutil
 import sys
 import tempfile
+import threading
+from collections import OrderedDict
 from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Generator, List, Optional
+from typing import Callable, Generator, List, Optional
 
 import djvu.decode
 import numpy
@@ -56,6 +58,9 @@ class DjVuProcessor:
     with Copyright © 2010-2021 Jakub Wilk <jwilk@jwilk.net> and GNU General Public License version 2
     """
 
+    # maximum number of DjVuFile metadata results kept by get_djvu_file
+    DJVU_FILE_CACHE_SIZE = 32
+
     def __init__(
         self,
         package_mode: Optional[PackageMode] = None,
@@ -102,6 +107,9 @@ class DjVuProcessor:
         self.djvu_pixel_format.rows_top_to_bottom = 1
         self.djvu_pixel_format.y_top_to_bottom = 0
         self.shell = Shell()
+        # LRU cache of DjVuFile results keyed by (full_path, mtime_ns, size)
+        self.djvu_file_cache: OrderedDict = OrderedDict()
+        self.djvu_file_cache_lock = threading.Lock()
 
     def handle_message(self, message):
         if isinstance(message, djvu.decode.ErrorMessage):
@@ -306,18 +314,22 @@ class DjVuProcessor:
         url: str,
         config: DjVuConfig,
         progressbar: Optional["Progressbar"] = None,
+        force: bool = False,
+        page_callback: Optional[Callable[[DjVuPage], None]] = None,
     ) -> DjVuFile:
         """
         Efficiently retrieves DjVu file metadata and page structure.
 
-        This method parses the document structure and page headers to construct
-        a DjVuFile object with DjVuPage children without fully decoding
-        the pixel data of the images.
+        Results are cached keyed by path, modification time and size so that
+        repeated requests for an unchanged file do not parse it again.
 
         Args:
             url (str): The url or file system path to the .djvu file.
             config(DjVuConfig): the config to use for path handling
             progressbar (Optional[Progressbar]): Optional progress bar to track processing
+            force (bool): if True bypass the cache and parse the file again
+            page_callback (Optional[Callable]): called with each page in order as soon as
+                its metadata is available - not called for cached results
 
         Returns:
             DjVuFile: The structured representation of the DjVu file.
@@ -325,99 +337,92 @@ class DjVuProcessor:
         # get the relative path
         relpath = MediaWikiImage.relpath_of_url(url)
         full_path = config.full_path(relpath)
+        self.ensure_file_exists(full_path)
+        stat = os.stat(full_path)
+        cache_key = (os.path.abspath(full_path), stat.st_mtime_ns, stat.st_size)
+        djvu_file = None
+        if not force:
+            with self.djvu_file_cache_lock:
+                djvu_file = self.djvu_file_cache.get(cache_key)
+                if djvu_file is not None:
+                    self.djvu_file_cache.move_to_end(cache_key)
+        if djvu_file is None:
+            djvu_file = self.read_djvu_file(
+                full_path, relpath, progressbar, page_callback
+            )
+            with self.djvu_file_cache_lock:
+                self.djvu_file_cache[cache_key] = djvu_file
+                while len(self.djvu_file_cache) > self.DJVU_FILE_CACHE_SIZE:
+                    self.djvu_file_cache.popitem(last=False)
+        return djvu_file
+
+    def read_djvu_file(
+        self,
+        full_path: str,
+        relpath: str,
+        progressbar: Optional["Progressbar"] = None,
+        page_callback: Optional[Callable[[DjVuPage], None]] = None,
+    ) -> DjVuFile:
+        """
+        Parse the DjVu file metadata and page structure.
+
+        This method parses the document structure and page headers to construct
+        a DjVuFile object with DjVuPage children without fully decoding
+        the pixel data of the images.
 
+        Args:
+            full_path (str): The file system path to the .djvu file.
+            relpath (str): The wiki image relative path of the .djvu file.
+            progressbar (Optional[Progressbar]): Optional progress bar to track processing
+            page_callback (Optional[Callable]): called with each page in order as soon as
+                its metadata is available
+
+        Returns:
+            DjVuFile: The structured representation of the DjVu file.
+        """
         # 1. Get container file metadata
-        self.ensure_file_exists(full_path)
         iso_date, filesize = ImageJob.get_fileinfo(full_path)
 
         pages: List[DjVuPage] = []
-        is_bundled = False
-        dir_pages = 0
-        doc_info_captured = False
 
-        # Get document to determine total pages for progress bar
         document = self.context.new_document(djvu.decode.FileURI(full_path))
         document.decoding_job.wait()
+        # document.type: 0=Single, 1=Indirect, 2=Bundled
+        is_bundled = document.type == 2
+        # document.files contains the directory of included files
+        dir_pages = len(document.files)
+        document_pages = list(document.pages)
 
         # Set up progress bar if provided
         if progressbar:
-            total_pages = len(document.pages)
-            progressbar.total = total_pages
+            progressbar.total = len(document_pages)
             progressbar.reset()
             progressbar.set_description(f"Loading {os.path.basename(full_path)}")
 
-        # 2. Iterate pages using existing generator
-        # document is the same reference in every iteration
-        for document, page in self.yield_pages(full_path):
-
-            # Capture document-level flags on first pass
-            if not doc_info_captured:
-                # document.type: 0=Single, 1=Indirect, 2=Bundled
-                is_bundled = document.type == 2
-                # document.files contains the directory of included files
-                dir_pages = len(document.files)
-                doc_info_captured = True
-
-            page_index = len(pages) + 1
-
-            # 3. Retrieve Page Metadata (Lightweight)
-            # get_info waits for IFF headers (dimensions, dpi) but not pixel decoding
-            try:
-                page.get_info(wait=True)
-                valid_page = True
-                width = page.width
-                height = page.height
-                dpi = page.dpi
-                error_msg = None
-            except Exception as e:
-                valid_page = False
-                width = 0
-                height = 0
-                dpi = 0
-                error_msg = str(e)
-                if self.debug:
-                    logging.warning(
-                        f"Failed to get info for page {page_index} in {full_path}: {e}"
-                    )
-
-            # 4. Determine Filename and File-specific stats
-            try:
-                # Handle bytes vs str filename encoding issues typical in djvulibre bindings
-                page_filename = page.file.name
-                if isinstance(page_filename, bytes):
-                    page_filename = page_filename.decode("utf-8", errors="replace")
-            except Exception:
-                page_filename = f"page_{page_index:04d}.djvu"
-
-            # Default to container stats
-            page_iso = iso_date
-            page_size = filesize
-
-            # If not bundled (Indirect), the page is likely a separate file on disk
-            if not is_bundled:
-                dirname = os.path.dirname(full_path)
-                component_path = os.path.join(dirname, page_filename)
-                # Only override if the component file physically exists
-                if os.path.exists(component_path):
-                    page_iso, page_size = ImageJob.get_fileinfo(component_path)
-
-            # 5. Construct Page Object
-            djvu_page = DjVuPage(
-                path=page_filename,
-                page_index=page_index,
-                valid=valid_page,
-                iso_date=page_iso,
-                filesize=page_size,
-                width=width,
-                height=height,
-                dpi=dpi,
-                djvu_path=relpath,
-                error_msg=error_msg,
-            )
-            pages.append(djvu_page)
-            # Update progress bar
-            if progressbar:
-                progressbar.update(1)
+        # 2. Retrieve the page metadata in parallel - the pages are independent
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            page_futures = [
+                executor.submit(
+                    self.get_djvu_page,
+                    page,
+                    page_index,
+                    full_path,
+                    relpath,
+                    is_bundled,
+                    iso_date,
+                    filesize,
+                )
+                for page_index, page in enumerate(document_pages, start=1)
+            ]
+            # keep the page order
+            for page_future in page_futures:
+                djvu_page = page_future.result()
+                pages.append(djvu_page)
+                if page_callback:
+                    page_callback(djvu_page)
+                # Update progress bar
+                if progressbar:
+                    progressbar.update(1)
 
         # 6. Construct and return File Object
         djvu_file = DjVuFile(
@@ -434,6 +439,87 @@ class DjVuProcessor:
 
         return djvu_file
 
+    def get_djvu_page(
+        self,
+        page: djvu.decode.Page,
+        page_index: int,
+        full_path: str,
+        relpath: str,
+        is_bundled: bool,
+        iso_date: Optional[str],
+        filesize: Optional[int],
+    ) -> DjVuPage:
+        """
+        Get the metadata of a single page without decoding its pixel data.
+
+        Args:
+            page: the djvulibre page
+            page_index: 1-based index of the page
+            full_path: file system path of the container DjVu file
+            relpath: wiki image relative path of the container DjVu file
+            is_bundled: True if the container is a bundled document
+            iso_date: ISO date of the container file
+            filesize: size of the container file
+
+        Returns:
+            DjVuPage: the page metadata
+        """
+        # 3. Retrieve Page Metadata (Lightweight)
+        # get_info waits for IFF headers (dimensions, dpi) but not pixel decoding
+        try:
+            page.get_info(wait=True)
+            valid_page = True
+            width = page.width
+            height = page.height
+            dpi = page.dpi
+            error_msg = None
+        except Exception as e:
+            valid_page = False
+            width = 0
+            height = 0
+            dpi = 0
+            error_msg = str(e)
+            if self.debug:
+                logging.warning(
+                    f"Failed to get info for page {page_index} in {full_path}: {e}"
+                )
+
+        # 4. Determine Filename and File-specific stats
+        try:
+            # Handle bytes vs str filename encoding issues typical in djvulibre bindings
+            page_filename = page.file.name
+            if isinstance(page_filename, bytes):
+                page_filename = page_filename.decode("utf-8", errors="replace")
+        except Exception:
+            page_filename = f"page_{page_index:04d}.djvu"
+
+        # Default to container stats
+        page_iso = iso_date
+        page_size = filesize
+
+        # If not bundled (Indirect), the page is likely a separate file on disk
+        if not is_bundled:
+            dirname = os.path.dirname(full_path)
+            component_path = os.path.join(dirname, page_filename)
+            # Only override if the component file physically exists
+            if os.path.exists(component_path):
+                page_iso, page_size = ImageJob.get_fileinfo(component_path)
+
+        # 5. Construct Page Object
+        djvu_page = DjVuPage(
+            path=page_filename,
+            page_index=page_index,
+            valid=valid_page,
+            iso_date=page_iso,
+            filesize=page_size,
+            width=width,
+            height=height,
+            dpi=dpi,
+            djvu_path=relpath,
+            error_msg=error_msg,
+        )
+        return djvu_page
+
     def yield_pages(self, djvu_path: str):
         """
         yield the pages for the given djvu_path
@@ -457,6 +543,8 @@ class DjVuProcessor:
         """
         image_jobs = []
         page_index = 0
+        # the prefix only depends on the document - compute it once
+        doc_prefix = ImageJob.get_prefix(relurl)
         for document, page in self.yield_pages(djvu_path):
             page_index += 1
             job = ImageJob(
@@ -465,6 +553,7 @@ class DjVuProcessor:
                 page=page,
                 page_index=page_index,
                 relurl=relurl,
+                doc_prefix=doc_prefix,
                 debug=self.debug,
                 verbose=self.verbose,
             )
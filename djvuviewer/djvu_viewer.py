@@ -5,15 +5,25 @@ Created on 2025-02-25
 @author: wf
 """
 
+import hashlib
 import logging
 import mimetypes
+import os
+import threading
 import traceback
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Tuple
 from urllib.parse import unquote_plus
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, HTMLResponse, Response
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 
 from djvuviewer.djvu_config import DjVuConfig
@@ -28,6 +38,12 @@ class DjVuViewer:
     """
 
     _static_mounted = False
+    # number of deserialized DjVuFiles kept for page flipping
+    DJVU_FILE_CACHE_SIZE = 256
+    # browsers revalidate the package content with the ETag after a day
+    CACHE_CONTROL = "public, max-age=86400"
+    # upper bound of the on-disk jpg cache - the least recently used files are evicted
+    JPG_CACHE_MAX_BYTES = 512 * 1024 * 1024
 
     def __init__(self, app: FastAPI, config: DjVuConfig):
         """
@@ -41,6 +57,19 @@ class DjVuViewer:
         self.url_prefix = self.config.url_prefix.rstrip("/")
         self.app = app
         self.package_mode = PackageMode.from_name(self.config.package_mode)
+        # LRU of package path -> ((mtime_ns, size), DjVuFile)
+        self.djvu_file_cache = OrderedDict()
+        self.djvu_file_cache_lock = threading.Lock()
+        # converted jpg pages
+        cache_base = (
+            Path(self.config.cache_path)
+            if self.config.cache_path
+            else Path.home() / ".djvuviewer" / "cache"
+        )
+        self.jpg_cache_path = cache_base / "jpg"
+        # bytes in the jpg cache - counted on the first store
+        self.jpg_cache_size: Optional[int] = None
+        self.jpg_cache_lock = threading.Lock()
 
         if not DjVuViewer._static_mounted:
             app.mount(
@@ -63,7 +92,8 @@ class DjVuViewer:
             self.error_msg = str(e)
         logging.error(self.error_msg)
 
-    def sanitize_path(self, path: str) -> str:
+    @staticmethod
+    def sanitize_path(path: str) -> str:
         """
         Fix mediawiki path quirks e.g. with blanks and plus signs
         """
@@ -81,20 +111,139 @@ class DjVuViewer:
             file (str): The full path in the format <DjVu name>/<file name>.
         """
         djvu_name, filename = file.split("/", 1)
+        package_path = self.get_package_path(djvu_name)
+        file_content = Packager.read_from_package(package_path, filename)
+        return filename, file_content
+
+    def get_package_path(self, djvu_name: str) -> Path:
+        """
+        Get the path of the package for the given DjVu name in my package mode.
+
+        Args:
+            djvu_name (str): the DjVu name without extension
+
+        Returns:
+            Path: the package path
+        """
         package_path = (
             Path(self.config.package_path) / f"{djvu_name}.{self.package_mode.ext}"
         )
-        file_content = Packager.read_from_package(package_path, filename)
-        return filename, file_content
+        return package_path
+
+    def get_etag(self, package_path: Path, *variant) -> str:
+        """
+        Get an ETag for content derived from the given package.
+
+        Args:
+            package_path (Path): the package the content is taken from
+            *variant: the parts identifying the content e.g. path, scale and quality
+
+        Returns:
+            str: the quoted ETag - changes whenever the package is rewritten
+
+        Raises:
+            FileNotFoundError: if the package does not exist
+        """
+        stat = os.stat(package_path)
+        key_str = ":".join(
+            str(part) for part in (stat.st_mtime_ns, stat.st_size, *variant)
+        )
+        etag = (
+            f'"{hashlib.blake2b(key_str.encode("utf-8"), digest_size=16).hexdigest()}"'
+        )
+        return etag
+
+    def get_not_modified_response(
+        self, etag: str, if_none_match: Optional[str]
+    ) -> Optional[Response]:
+        """
+        Get a 304 Not Modified response if the client already has the content.
+
+        Args:
+            etag (str): the ETag of the current content
+            if_none_match (Optional[str]): the If-None-Match request header
+
+        Returns:
+            Optional[Response]: the 304 response or None if the content needs to be sent
+        """
+        not_modified_response = None
+        if if_none_match:
+            client_etags = {tag.strip() for tag in if_none_match.split(",")}
+            if etag in client_etags or "*" in client_etags:
+                not_modified_response = Response(
+                    status_code=304,
+                    headers={"ETag": etag, "Cache-Control": DjVuViewer.CACHE_CONTROL},
+                )
+        return not_modified_response
+
+    def get_media_type(self, filename: str) -> str:
+        """
+        Detect the MIME type based on the file extension.
+
+        Args:
+            filename (str): the file name
 
-    def create_content_response(self, filename: str, file_content: bytes) -> Response:
-        # Detect MIME type based on file extension
+        Returns:
+            str: the media type - application/octet-stream for unknown types
+        """
         media_type, _ = mimetypes.guess_type(filename)
         if media_type is None:
             media_type = "application/octet-stream"  # Default for unknown types
+        return media_type
+
+    def add_cache_headers(self, response: Response, etag: Optional[str]):
+        """
+        Add the ETag and Cache-Control headers to the given response.
 
+        Args:
+            response (Response): the response to modify
+            etag (Optional[str]): the ETag - no headers are added if None
+        """
+        if etag:
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = DjVuViewer.CACHE_CONTROL
+
+    def create_content_response(
+        self, filename: str, file_content: bytes, etag: Optional[str] = None
+    ) -> Response:
+        media_type = self.get_media_type(filename)
         content_response = Response(content=file_content, media_type=media_type)
+        self.add_cache_headers(content_response, etag)
+
+        return content_response
+
+    def create_package_content_response(
+        self, file: str, etag: Optional[str] = None
+    ) -> Response:
+        """
+        Create the response for a content file of a package.
+
+        Files of plain tarballs are streamed in chunks straight from their
+        offset in the tarball instead of being read into memory first.
+
+        Args:
+            file (str): The full path in the format <DjVu name>/<file name>.
+            etag (Optional[str]): the ETag of the content
 
+        Returns:
+            Response: the streaming or in memory content response
+        """
+        djvu_name, filename = file.split("/", 1)
+        package_path = self.get_package_path(djvu_name)
+        member_range = Packager.get_member_range(package_path, filename)
+        if member_range is None:
+            filename, file_content = self.get_file_content(file)
+            content_response = self.create_content_response(
+                filename, file_content, etag
+            )
+        else:
+            offset, size = member_range
+            content_response = StreamingResponse(
+                Packager.iter_file_range(package_path, offset, size),
+                media_type=self.get_media_type(filename),
+                headers={"Content-Length": str(size)},
+            )
+            self.add_cache_headers(content_response, etag)
         return content_response
 
     def get_package_response(self, path: str) -> FileResponse:
@@ -125,18 +274,24 @@ class DjVuViewer:
         )
         return response
 
-    def get_content(self, file: str) -> Response:
+    def get_content(self, file: str, if_none_match: Optional[str] = None) -> Response:
         """
         Retrieves a content file (PNG, JPG, YAML, etc.) from the package and serves it as a response.
 
         Args:
             file (str): The full path in the format <DjVu name>/<file name>.
+            if_none_match (Optional[str]): the If-None-Match request header
 
         Returns:
-            Response: The requested content file with the correct media type.
+            Response: The requested content file with the correct media type
+            or 304 Not Modified if the client's copy is still current.
         """
         try:
-            filename, file_content = self.get_file_content(file)
+            djvu_name, _ = file.split("/", 1)
+            etag = self.get_etag(self.get_package_path(djvu_name), file)
+            content_response = self.get_not_modified_response(etag, if_none_match)
+            if content_response is None:
+                content_response = self.create_package_content_response(file, etag)
         except ValueError:
             raise HTTPException(
                 status_code=400,
@@ -150,9 +305,83 @@ class DjVuViewer:
                 status_code=404,
                 detail=f"File {filename} of DjVu {djvu_name} not found in archive",
             )
-        content_response = self.create_content_response(filename, file_content)
         return content_response
 
+    def get_djvu_file(self, package_path: Path) -> Optional[DjVuFile]:
+        """
+        Get the DjVuFile for the given package - the deserialized file is
+        cached by package path and only reloaded when the package's
+        modification time or size changes.
+
+        Args:
+            package_path (Path): Path to the package
+
+        Returns:
+            Optional[DjVuFile]: the (shared, read-only) DjVuFile or None if
+            the package does not exist
+        """
+        djvu_file = None
+        try:
+            stat = os.stat(package_path)
+        except FileNotFoundError:
+            return djvu_file
+        key = str(package_path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self.djvu_file_cache_lock:
+            entry = self.djvu_file_cache.get(key)
+            if entry is not None and entry[0] == signature:
+                self.djvu_file_cache.move_to_end(key)
+                djvu_file = entry[1]
+        if djvu_file is None:
+            djvu_file = DjVuFile.from_package(package_path)
+            if djvu_file is not None:
+                with self.djvu_file_cache_lock:
+                    self.djvu_file_cache[key] = (signature, djvu_file)
+                    self.djvu_file_cache.move_to_end(key)
+                    if len(self.djvu_file_cache) > DjVuViewer.DJVU_FILE_CACHE_SIZE:
+                        self.djvu_file_cache.popitem(last=False)
+        return djvu_file
+
+    def get_package_location(self, path: str) -> Tuple[str, str, Path]:
+        """
+        Resolve the path of a DjVu file to its package in my package mode.
+
+        Args:
+            path (str): Path to the DjVu file (without page notation).
+
+        Returns:
+            Tuple[str, str, Path]: the sanitized path, the package filename
+            and the package path
+        """
+        package_location = DjVuViewer.resolve_package_location(
+            self.config.package_path, self.package_mode.ext, path
+        )
+        return package_location
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def resolve_package_location(
+        package_base: str, ext: str, path: str
+    ) -> Tuple[str, str, Path]:
+        """
+        Resolve the path of a DjVu file to its package - cached by all
+        arguments since every page flip of a document asks for the same path.
+
+        Args:
+            package_base (str): the directory of the packages
+            ext (str): the package extension
+            path (str): Path to the DjVu file (without page notation).
+
+        Returns:
+            Tuple[str, str, Path]: the sanitized path, the package filename
+            and the package path
+        """
+        path = DjVuViewer.sanitize_path(path)
+        package_filename = f"{Path(path).stem}.{ext}"
+        package_path = Path(package_base) / package_filename
+        package_location = (path, package_filename, package_path)
+        return package_location
+
     def get_djvu_view_page(self, path: str, page_index: int) -> DjVuViewPage:
         """
         Helper function to fetch DjVu page data.
@@ -164,10 +393,8 @@ class DjVuViewer:
         Returns:
             DjVuViewPage: dataclass instance with file,page and image_url
         """
-        path = self.sanitize_path(path)
-        package_filename = f"{Path(path).stem}.{self.package_mode.ext}"
-        package_path = Path(self.config.package_path) / package_filename
-        djvu_file = DjVuFile.from_package(package_path)
+        path, package_filename, package_path = self.get_package_location(path)
+        djvu_file = self.get_djvu_file(package_path)
 
         if not djvu_file:
             raise HTTPException(
@@ -184,7 +411,13 @@ class DjVuViewer:
         return djvu_view_page
 
     def get_page4path(
-        self, path: str, pageno: int, ext: str, scale: float = 1.0, quality: int = 85
+        self,
+        path: str,
+        pageno: int,
+        ext: str,
+        scale: float = 1.0,
+        quality: int = 85,
+        if_none_match: Optional[str] = None,
     ) -> Response:
         """
         Fetches and displays a specific page of a DjVu file in the desired format.
@@ -195,9 +428,11 @@ class DjVuViewer:
             ext (str): The desired file extension for the page (e.g., "png", "jpg").
             scale (float, optional): The scale factor to apply to the image (0.0-1.0). Defaults to 1.0.
             quality (int, optional): The JPEG quality (1-100). Defaults to 85.
+            if_none_match (Optional[str]): the If-None-Match request header
 
         Returns:
-            Response: Response with the page content in the requested format.
+            Response: Response with the page content in the requested format
+            or 304 Not Modified if the client's copy is still current.
 
         Raises:
             HTTPException: With status code 501 if the specified file extension is unsupported.
@@ -215,32 +450,155 @@ class DjVuViewer:
             # Get the DjVu view page
             djvu_view_page = self.get_djvu_view_page(path, pageno)
             content_path = djvu_view_page.content_path
+            djvu_name, _ = content_path.split("/", 1)
+            etag = self.get_etag(
+                self.get_package_path(djvu_name), content_path, ext, scale, quality
+            )
+            file_response = self.get_not_modified_response(etag, if_none_match)
+            if file_response is None:
+                if ext == "jpg":
+                    # converted from the PNG original - cached on disk
+                    filename, file_content = self.get_jpg_content(
+                        djvu_view_page, scale=scale, quality=quality
+                    )
+                    file_response = self.create_content_response(
+                        filename, file_content, etag
+                    )
+                else:
+                    # the original file content (PNG format)
+                    file_response = self.create_package_content_response(
+                        content_path, etag
+                    )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Error retrieving page content: {str(e)}"
+            )
+        return file_response
 
-            # Get the original file content (PNG format)
-            filename, file_content = self.get_file_content(content_path)
+    def get_jpg_content(
+        self, djvu_view_page: DjVuViewPage, scale: float, quality: int
+    ) -> Tuple[str, bytes]:
+        """
+        Get the JPG conversion of the PNG original of the given page.
 
-            # If JPG is requested, convert the PNG data to JPG
-            if ext == "jpg":
-                # Extract the DPI from the page metadata (assuming it's available)
-                # If not available, you might need to add a parameter or use a default value
-                dpi = getattr(
-                    djvu_view_page.page, "dpi", 300
-                )  # Default to 300 if not specified
+        The converted bytes are cached on disk keyed by the package's
+        modification time and size, the content path, scale and quality
+        so that repeated requests skip the decode, scale and encode.
+        Only scales with two decimals and qualities in steps of 5 are cached.
 
-                # Use ImageConverter to convert PNG to JPG
-                converter = ImageConverter(file_content, dpi)
-                file_content = converter.convert_to_jpg(scale=scale, quality=quality)
+        Args:
+            djvu_view_page (DjVuViewPage): the page to convert
+            scale (float): The scale factor to apply to the image (0.0-1.0).
+            quality (int): The JPEG quality (1-100).
 
-                # Update filename to reflect the JPG extension
-                filename = filename.replace(".png", ".jpg")
+        Returns:
+            Tuple[str, bytes]: the JPG filename and content
+        """
+        content_path = djvu_view_page.content_path
+        djvu_name, png_filename = content_path.split("/", 1)
+        filename = png_filename.replace(".png", ".jpg")
+        package_path = self.get_package_path(djvu_name)
+        stat = os.stat(package_path)
+        # scales >= 1.0 do not scale - only cache a bounded set of variants
+        scale = min(scale, 1.0)
+        quality = max(1, min(quality, 100))
+        cacheable = round(scale, 2) == scale and quality % 5 == 0
+        jpg_path = None
+        file_content = None
+        if cacheable:
+            key_str = (
+                f"{stat.st_mtime_ns}:{stat.st_size}:{content_path}:{scale}:{quality}"
+            )
+            key = hashlib.blake2b(key_str.encode("utf-8"), digest_size=16).hexdigest()
+            jpg_path = self.jpg_cache_path / f"{key}.jpg"
+            try:
+                file_content = jpg_path.read_bytes()
+                # the modification time marks the last use for the eviction
+                os.utime(jpg_path)
+            except FileNotFoundError:
+                pass
+        if file_content is None:
+            _, png_content = self.get_file_content(content_path)
+            # Default to 300 dpi if not specified in the page metadata
+            dpi = getattr(djvu_view_page.page, "dpi", 300)
+            converter = ImageConverter(png_content, dpi)
+            file_content = converter.convert_to_jpg(scale=scale, quality=quality)
+            if jpg_path is not None:
+                self.store_jpg(jpg_path, file_content)
+        jpg_content = (filename, file_content)
+        return jpg_content
+
+    def store_jpg(self, jpg_path: Path, file_content: bytes):
+        """
+        Store converted jpg content in the on-disk cache.
 
-            # Create and return the response with the appropriate content
-            file_response = self.create_content_response(filename, file_content)
-            return file_response
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Error retrieving page content: {str(e)}"
+        Args:
+            jpg_path (Path): the cache file
+            file_content (bytes): the jpg bytes
+        """
+        try:
+            jpg_path.parent.mkdir(parents=True, exist_ok=True)
+            # write and rename so that concurrent readers never see a partial file
+            tmp_path = jpg_path.with_suffix(
+                f".{os.getpid()}.{threading.get_ident()}.tmp"
             )
+            tmp_path.write_bytes(file_content)
+            os.replace(tmp_path, jpg_path)
+            self.prune_jpg_cache(len(file_content))
+        except OSError as ex:
+            logging.warning(f"could not cache {jpg_path}: {ex}")
+
+    def prune_jpg_cache(self, added_bytes: int = 0):
+        """
+        Account for the added bytes and evict the least recently used
+        jpg files once the cache exceeds JPG_CACHE_MAX_BYTES.
+
+        Files of rewritten packages are never hit again and are evicted first.
+
+        Args:
+            added_bytes (int): the number of bytes just stored
+        """
+        max_bytes = DjVuViewer.JPG_CACHE_MAX_BYTES
+        with self.jpg_cache_lock:
+            if self.jpg_cache_size is not None:
+                self.jpg_cache_size += added_bytes
+            if self.jpg_cache_size is None or self.jpg_cache_size > max_bytes:
+                # rescan - other processes may share the cache directory
+                entries = []
+                for jpg_path in self.jpg_cache_path.glob("*.jpg"):
+                    try:
+                        stat = jpg_path.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, jpg_path))
+                cache_size = sum(size for _, size, _ in entries)
+                if cache_size > max_bytes:
+                    # evict down to 90% so that not every store needs a rescan
+                    entries.sort()
+                    for _, size, jpg_path in entries:
+                        if cache_size <= max_bytes * 0.9:
+                            break
+                        jpg_path.unlink(missing_ok=True)
+                        cache_size -= size
+                self.jpg_cache_size = cache_size
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def get_page_options(total_pages: int) -> str:
+        """
+        Get the option elements for the page dropdown - cached by page count.
+
+        Args:
+            total_pages: Total number of pages in the document
+
+        Returns:
+            HTML option elements with none selected
+        """
+        options_html = "\n".join(
+            f'<option value="{page_num}">{page_num}</option>'
+            for page_num in range(1, total_pages + 1)
+        )
+        return options_html
 
     def create_page_dropdown(self, path, current_page, total_pages):
         """
@@ -254,12 +612,12 @@ class DjVuViewer:
         Returns:
             HTML select element with page options
         """
-        options = []
-        for page_num in range(1, total_pages + 1):
-            selected = " selected" if page_num == current_page else ""
-            options.append(f'<option value="{page_num}"{selected}>{page_num}</option>')
-
-        options_html = "\n".join(options)
+        # only the selected option differs between the pages of a document
+        options_html = DjVuViewer.get_page_options(total_pages).replace(
+            f'<option value="{current_page}">',
+            f'<option value="{current_page}" selected>',
+            1,
+        )
 
         select_html = f"""<select onchange="window.location.href='{self.url_prefix}/djvu/{path}?page='+this.value">
         {options_html}
@@ -4,46 +4,137 @@ Created on 2026-01-02
 @author: wf
 """
 
+import json
+import logging
 import os
+import pickle
+import threading
+from contextlib import contextmanager
 from dataclasses import field
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import List, Optional
+from typing import (
+    TYPE_CHECKING,
+    ClassVar,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
+import requests
 from basemkit.yamlable import lod_storable
-from ngwidgets.progress import Progressbar
+from requests.adapters import HTTPAdapter
 
 from djvuviewer.djvu_config import DjVuConfig
+from djvuviewer.djvu_core import init_field_names
 from djvuviewer.wiki_images import MediaWikiImage, MediaWikiImages
 
+try:
+    import fcntl
+except ImportError:
+    # no inter-process file locking on this platform (Windows)
+    fcntl = None
+
+if TYPE_CHECKING:
+    # the progress bars pull in nicegui - only needed for the annotations
+    from ngwidgets.progress import Progressbar
+
+logger = logging.getLogger(__name__)
+
 
 class DjVuMediaWikiImages:
     """
     MediaWiki images handler
     """
 
+    # process wide pooled session shared by all clients without an own session
+    shared_session: ClassVar[Optional[requests.Session]] = None
+    # process wide clients on the shared session by url
+    shared_clients: ClassVar[Dict[str, MediaWikiImages]] = {}
+    shared_lock = threading.RLock()
+
     @classmethod
-    def get_mediawiki_images_client(cls, url: str) -> MediaWikiImages:
+    def get_mediawiki_images_client(
+        cls, url: str, session: Optional[requests.Session] = None
+    ) -> MediaWikiImages:
         """
         Get the images client for the given url.
 
         Args:
             url: MediaWiki base URL
+            session: Optional shared requests.Session whose connection pool to reuse,
+                defaults to the process wide pooled session - the client is then
+                shared process wide as well
 
         Returns:
             MediaWikiImages client instance or None
         """
         mw_client = None
-        if url:
+        if url and session is None:
+            mw_client = cls.shared_clients.get(url)
+            if mw_client is None:
+                with cls.shared_lock:
+                    mw_client = cls.shared_clients.get(url)
+                    if mw_client is None:
+                        mw_client = cls.get_mediawiki_images_client(
+                            url, session=cls.get_shared_session()
+                        )
+                        cls.shared_clients[url] = mw_client
+        elif url:
             api_epp = "api.php"
             base = url if url.endswith("/") else f"{url}/"
             mw_client = MediaWikiImages(
                 api_url=f"{base}{api_epp}",
                 mime_types=("image/vnd.djvu", "image/x-djvu"),
                 timeout=10,
+                session=session,
             )
         return mw_client
 
+    @classmethod
+    def get_pooled_session(
+        cls, pool_connections: int = 10, pool_maxsize: int = 20
+    ) -> requests.Session:
+        """
+        Get a requests.Session with a keep-alive connection pool
+        to be shared by several clients.
+
+        Args:
+            pool_connections: number of per-host pools to cache
+            pool_maxsize: maximum number of connections kept per host
+
+        Returns:
+            requests.Session: the pooled session
+        """
+        session = requests.Session()
+        # retries are handled by MediaWikiImages with backoff
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @classmethod
+    def get_shared_session(cls) -> requests.Session:
+        """
+        Get the process wide pooled session so that keep-alive
+        connections are reused across clients and pagination requests.
+
+        Returns:
+            requests.Session: the shared pooled session
+        """
+        session = cls.shared_session
+        if session is None:
+            with cls.shared_lock:
+                if cls.shared_session is None:
+                    cls.shared_session = cls.get_pooled_session()
+                session = cls.shared_session
+        return session
+
 
 @lod_storable
 class DjVuImagesCache:
@@ -56,6 +147,14 @@ class DjVuImagesCache:
     images: List[MediaWikiImage] = field(default_factory=list)
     last_fetch: Optional[datetime] = None
 
+    # in process memo of the loaded caches by (cache_file, url, limit)
+    instances: ClassVar[Dict[Tuple[str, str, int], "DjVuImagesCache"]] = {}
+    # keys of the caches being refreshed in the background
+    refreshing: ClassVar[Set[Tuple[str, str, int]]] = set()
+    refresh_lock: ClassVar[threading.Lock] = threading.Lock()
+    # bump when the snapshot layout changes - the field names are checked as well
+    SNAPSHOT_VERSION: ClassVar[int] = 1
+
     def __post_init__(self):
         """Initialize transient (non-serializable) attributes."""
         self._mw_client = None
@@ -109,6 +208,156 @@ class DjVuImagesCache:
         cache_file = str(base_dir / f"djvu_images_{name}.{ext}")
         return cache_file
 
+    @classmethod
+    def get_snapshot_file(cls, cache_file: str) -> str:
+        """
+        Get the path of the binary snapshot next to the given json cache file.
+
+        Args:
+            cache_file: Path to the json cache file
+
+        Returns:
+            Path to the pickle snapshot file
+        """
+        snapshot_file = f"{os.path.splitext(cache_file)[0]}.pkl"
+        return snapshot_file
+
+    @classmethod
+    def get_snapshot_signature(cls) -> Tuple:
+        """
+        Get the signature of the current snapshot layout - a snapshot with
+        another signature was written for other class layouts and is ignored.
+
+        Returns:
+            the snapshot version and the field names of the cache and the images
+        """
+        signature = (
+            cls.SNAPSHOT_VERSION,
+            init_field_names(cls),
+            init_field_names(MediaWikiImage),
+        )
+        return signature
+
+    def save_snapshot(self, snapshot_file: str):
+        """
+        Save a pickle snapshot of my serializable fields.
+
+        Args:
+            snapshot_file: Path to the pickle snapshot file
+        """
+        # transient attributes such as the client are not part of the snapshot
+        state = {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+        snapshot = {"signature": self.get_snapshot_signature(), "state": state}
+        tmp_file = f"{snapshot_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, snapshot_file)
+
+    @classmethod
+    def load_cache_file(cls, cache_file: str) -> "DjVuImagesCache":
+        """
+        Load the cache from the given json cache file.
+
+        The json file stays the source of truth - the pickle snapshot
+        next to it is only used when it is not older than the json file
+        and has the current signature. It is (re)written after a json load.
+
+        Args:
+            cache_file: Path to the json cache file
+
+        Returns:
+            DjVuImagesCache instance
+        """
+        cache = None
+        snapshot_file = cls.get_snapshot_file(cache_file)
+        try:
+            if os.stat(snapshot_file).st_mtime_ns >= os.stat(cache_file).st_mtime_ns:
+                with open(snapshot_file, "rb") as f:
+                    snapshot = pickle.load(f)
+                if snapshot.get("signature") == cls.get_snapshot_signature():
+                    cache = cls(**snapshot["state"])
+                else:
+                    logger.info("ignoring outdated snapshot %s", snapshot_file)
+        except FileNotFoundError:
+            # no snapshot yet - a missing json file is reported by load_json
+            pass
+        except (
+            OSError,
+            pickle.UnpicklingError,
+            EOFError,
+            TypeError,
+            AttributeError,
+        ) as ex:
+            # unreadable snapshot - fall back to the json file
+            logger.warning("could not load snapshot %s: %s", snapshot_file, ex)
+        if cache is None:
+            cache = cls.load_json(cache_file)
+            try:
+                cache.save_snapshot(snapshot_file)
+            except OSError as ex:
+                logger.warning("could not write snapshot %s: %s", snapshot_file, ex)
+        return cache
+
+    def save_json(self, json_file: str):
+        """
+        Save me to the given json file in the save_to_json_file format.
+
+        The image records are taken straight from the instances instead of
+        the generic recursive dataclass conversion which dominates the
+        save time for thousands of images.
+
+        Args:
+            json_file: Path to the json file
+        """
+        last_fetch = self.last_fetch.timestamp() if self.last_fetch else None
+        data = {
+            "name": self.name,
+            "url": self.url,
+            "images": [img.__dict__ for img in self.images],
+            "last_fetch": last_fetch,
+        }
+        # write and rename so that readers never see a partial file
+        tmp_file = f"{json_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, json_file)
+
+    @classmethod
+    def load_json(cls, json_file: str) -> "DjVuImagesCache":
+        """
+        Load an instance from a json file written by save_json or save_to_json_file.
+
+        The images are constructed directly from their init fields instead of
+        the generic dataclass conversion which dominates the load time.
+
+        Args:
+            json_file: Path to the json file
+
+        Returns:
+            DjVuImagesCache instance
+        """
+        with open(json_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        image_fields = init_field_names(MediaWikiImage)
+        images = [
+            MediaWikiImage(
+                **{key: record.get(key) for key in image_fields if key in record}
+            )
+            for record in data.get("images") or []
+        ]
+        last_fetch = data.get("last_fetch")
+        if isinstance(last_fetch, (int, float)):
+            last_fetch = datetime.fromtimestamp(last_fetch, tz=timezone.utc)
+        elif isinstance(last_fetch, str):
+            last_fetch = datetime.fromisoformat(last_fetch)
+        cache = cls(
+            name=data.get("name"),
+            url=data.get("url"),
+            images=images,
+            last_fetch=last_fetch,
+        )
+        return cache
+
     def to_lod(self) -> List[dict]:
         """
         Convert the image list to a list of dicts for storage and tabular display.
@@ -117,12 +366,30 @@ class DjVuImagesCache:
         Returns:
             List of dicts, one per image, using MediaWikiImage dataclass fields.
         """
-        lod = [img.__dict__ for img in self.images]
-        if lod:
-            always_none = {k for k in lod[0] if all(r.get(k) is None for r in lod)}
-            lod = [{k: v for k, v in r.items() if k not in always_none} for r in lod]
+        lod = list(self.yield_records())
         return lod
 
+    def yield_records(self) -> Generator[dict, None, None]:
+        """
+        Generate the image records for storage and tabular display.
+        Columns that are None in every row are dropped.
+
+        Yields:
+            dict: the record of an image
+        """
+        # a single pass over the images to find the columns with values
+        columns = {}
+        for img in self.images:
+            for key, value in img.__dict__.items():
+                if value is not None:
+                    columns[key] = True
+                else:
+                    columns.setdefault(key, False)
+        keep = [key for key, has_value in columns.items() if has_value]
+        for img in self.images:
+            record = img.__dict__
+            yield {key: record.get(key) for key in keep}
+
     @classmethod
     def from_cache(
         cls,
@@ -131,7 +398,8 @@ class DjVuImagesCache:
         name: str,
         limit: int = 10000,
         freshness_days: int = 1,
-        progressbar: Progressbar = None,
+        progressbar: "Progressbar" = None,
+        stale_while_revalidate: bool = False,
     ) -> "DjVuImagesCache":
         """
         Load cache from file if fresh, otherwise fetch new data.
@@ -143,32 +411,180 @@ class DjVuImagesCache:
             limit: Maximum number of images to fetch
             freshness_days: Days before cache is considered stale
             progressbar: Optional progress bar
+            stale_while_revalidate: If True a stale cache is returned at once
+                and refreshed in a background thread - a missing cache or
+                freshness_days 0 (forced refresh) still fetch synchronously
 
         Returns:
             DjVuImagesCache instance
         """
         cache_file = cls.get_cache_file(config, name)
+        instance_key = (cache_file, url, limit)
+        serve_stale = stale_while_revalidate and freshness_days > 0
+
+        # Try the in process memo first - a stale one is served while
+        # its background refresh is under way
+        cache = None
+        memo = cls.instances.get(instance_key)
+        if memo is not None and (
+            memo.is_fresh(freshness_days)
+            or (serve_stale and instance_key in cls.refreshing)
+        ):
+            cache = memo
 
         # Try to load from cache
-        if os.path.exists(cache_file):
-            cache = cls.load_from_json_file(cache_file)
-            if cache.is_fresh(freshness_days):
-                return cache
+        if cache is None:
+            try:
+                stored = cls.load_cache_file(cache_file)
+            except FileNotFoundError:
+                stored = None
+            if stored is not None and stored.is_fresh(freshness_days):
+                cls.instances[instance_key] = stored
+                cache = stored
+            elif stored is not None and serve_stale:
+                # serve the stale data and refresh in the background
+                cls.instances.setdefault(instance_key, stored)
+                cls.start_refresh(cache_file, url, name, limit, freshness_days)
+                cache = stored
 
         # Cache missing or stale - fetch fresh data
-        if progressbar:
-            progressbar.desc = (
-                f"Fetching djvu {name} images to be cached from ... {url}"
+        if cache is None:
+            cache = cls.fetch(
+                cache_file,
+                url,
+                name,
+                limit,
+                progressbar=progressbar,
+                freshness_days=freshness_days,
             )
+        return cache
 
-        mw_client = DjVuMediaWikiImages.get_mediawiki_images_client(url)
-        images = mw_client.fetch_allimages(
-            limit=limit, as_objects=True, progressbar=progressbar
-        )
+    @classmethod
+    @contextmanager
+    def lock_cache_file(cls, cache_file: str) -> Generator[None, None, None]:
+        """
+        Hold an exclusive lock on the given cache file while it is fetched
+        and written - other threads, server processes and CLI runs wait.
 
-        cache = cls(
-            images=images, url=url, name=name, last_fetch=datetime.now(timezone.utc)
-        )
-        cache._mw_client = mw_client
-        cache.save_to_json_file(cache_file)
+        Args:
+            cache_file: Path to the json cache file
+        """
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(f"{cache_file}.lock", "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                # closing the file releases the lock
+                lock_file.close()
+
+    @classmethod
+    def fetch(
+        cls,
+        cache_file: str,
+        url: str,
+        name: str,
+        limit: int,
+        progressbar: "Progressbar" = None,
+        freshness_days: int = 0,
+    ) -> "DjVuImagesCache":
+        """
+        Fetch the images from the wiki and save them to the cache file
+        while holding the cache file lock.
+
+        Args:
+            cache_file: Path to the json cache file
+            url: MediaWiki base URL
+            name: Cache identifier
+            limit: Maximum number of images to fetch
+            progressbar: Optional progress bar
+            freshness_days: if > 0 a cache file that became fresh while
+                waiting for the lock is loaded instead of fetching again
+
+        Returns:
+            the fresh DjVuImagesCache instance
+        """
+        with cls.lock_cache_file(cache_file):
+            cache = None
+            if freshness_days > 0:
+                # another process may have fetched while we waited for the lock
+                try:
+                    cache = cls.load_cache_file(cache_file)
+                except FileNotFoundError:
+                    cache = None
+                if cache is not None and not cache.is_fresh(freshness_days):
+                    cache = None
+            if cache is None:
+                if progressbar:
+                    progressbar.desc = (
+                        f"Fetching djvu {name} images to be cached from ... {url}"
+                    )
+
+                mw_client = DjVuMediaWikiImages.get_mediawiki_images_client(url)
+                images = mw_client.fetch_allimages(
+                    limit=limit, as_objects=True, progressbar=progressbar
+                )
+
+                cache = cls(
+                    images=images,
+                    url=url,
+                    name=name,
+                    last_fetch=datetime.now(timezone.utc),
+                )
+                cache._mw_client = mw_client
+                cache.save_json(cache_file)
+                cache.save_snapshot(cls.get_snapshot_file(cache_file))
+            cls.instances[(cache_file, url, limit)] = cache
         return cache
+
+    @classmethod
+    def start_refresh(
+        cls, cache_file: str, url: str, name: str, limit: int, freshness_days: int
+    ):
+        """
+        Start a background refresh of the given cache unless one is under way.
+
+        Args:
+            cache_file: Path to the json cache file
+            url: MediaWiki base URL
+            name: Cache identifier
+            limit: Maximum number of images to fetch
+            freshness_days: Days before cache is considered stale
+        """
+        instance_key = (cache_file, url, limit)
+        with cls.refresh_lock:
+            start_refresh = instance_key not in cls.refreshing
+            cls.refreshing.add(instance_key)
+        if start_refresh:
+            thread = threading.Thread(
+                target=cls.refresh,
+                args=(cache_file, url, name, limit, freshness_days),
+                daemon=True,
+            )
+            thread.start()
+
+    @classmethod
+    def refresh(
+        cls, cache_file: str, url: str, name: str, limit: int, freshness_days: int
+    ):
+        """
+        Refresh a stale cache in the background - the next from_cache
+        call gets the fresh instance.
+
+        Args:
+            cache_file: Path to the json cache file
+            url: MediaWiki base URL
+            name: Cache identifier
+            limit: Maximum number of images to fetch
+            freshness_days: Days before cache is considered stale
+        """
+        instance_key = (cache_file, url, limit)
+        try:
+            cls.fetch(cache_file, url, name, limit, freshness_days=freshness_days)
+        except Exception as ex:
+            logger.warning("refresh of %s failed: %s", cache_file, ex)
+        finally:
+            with cls.refresh_lock:
+                cls.refreshing.discard(instance_key)
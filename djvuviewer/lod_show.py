@@ -10,6 +10,9 @@ from tabulate import tabulate
 
 
 class LodShow:
+    # above this number of rows string cells are not probed for numbers
+    NUMPARSE_MAX_ROWS = 1000
+
     @classmethod
     def show(cls, rows: List[Dict[str, Any]], tablefmt: str = "simple") -> None:
         """
@@ -19,4 +22,14 @@ class LodShow:
              rows: Result rows from run().
              tablefmt: tabulate format string (e.g. simple, grid, github).
         """
-        print(tabulate(rows, headers="keys", tablefmt=tablefmt))
+        # int and float cells stay right aligned - only the number
+        # parsing attempt for every string cell is skipped for large tables
+        disable_numparse = len(rows) > cls.NUMPARSE_MAX_ROWS
+        print(
+            tabulate(
+                rows,
+                headers="keys",
+                tablefmt=tablefmt,
+                disable_numparse=disable_numparse,
+            )
+        )
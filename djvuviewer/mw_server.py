@@ -6,6 +6,7 @@ MediaWiki Server handling
 @author: wf
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
 from dataclasses import dataclass, field
 import os
@@ -369,6 +370,9 @@ class ServerProfile:
     Profile server by checking test files.
     """
 
+    # concurrent ssh calls per host - sshd limits unauthenticated connections
+    MAX_WORKERS_PER_HOST = 4
+
     def __init__(
         self,
         config: ServerConfig = None,
@@ -552,14 +556,32 @@ class ServerProfile:
     def run(self):
         """
         Check all test files on all servers/image stores.
+
+        The djvudump ssh calls are latency bound and run concurrently -
+        with at most MAX_WORKERS_PER_HOST calls per host.
         """
-        for server, imagefolder in self.imagefolder_gen():
-            for tf in self.config.test_files:
-                if self.debug:
-                    print(f"checking sever {server.hostname} ...")
-                djvudump_ms = self.check_djvu(server, imagefolder, tf)
+        executors: Dict[str, ThreadPoolExecutor] = {}
+        checks = []
+        try:
+            for imagefolder in self.imagefolder_gen():
+                server = imagefolder._server
+                executor = executors.get(server.hostname)
+                if executor is None:
+                    executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS_PER_HOST)
+                    executors[server.hostname] = executor
+                for tf in self.config.test_files:
+                    if self.debug:
+                        print(f"checking sever {server.hostname} ...")
+                    future = executor.submit(self.check_djvu, server, imagefolder, tf)
+                    checks.append((imagefolder, future))
+            # assign in submission order - the last successful check wins as before
+            for imagefolder, future in checks:
+                djvudump_ms = future.result()
                 if djvudump_ms:
                     imagefolder.djvudumpMs = djvudump_ms
+        finally:
+            for executor in executors.values():
+                executor.shutdown()
 
     def save(self) -> None:
         """
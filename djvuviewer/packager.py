@@ -9,8 +9,11 @@ import os
 import tarfile
 import zipfile
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Any, Dict, Generator, List, Optional, Tuple, Union
+
+import yaml
 
 logger = logging.getLogger(__name__)
 
@@ -196,8 +199,141 @@ class Packager:
         else:
             raise ValueError(f"Unknown package extension: {ext}")
 
+    @classmethod
+    def load_yaml_from_package(
+        cls, package_path: Union[str, Path], filename: str
+    ) -> Any:
+        """
+        Load and parse a YAML file from a package.
+
+        The parsed data is cached by package path and modification time
+        and size so that repeated loads skip the inflate and parse and
+        a changed package is never served stale.
+
+        Args:
+            package_path (Union[str, Path]): Path to the package.
+            filename (str): Name of the YAML file inside the package.
+
+        Returns:
+            Any: the parsed YAML data - treat as read-only since it is shared
+        """
+        stat = os.stat(package_path)
+        data = cls.parse_yaml_from_package(
+            str(package_path), filename, stat.st_mtime_ns, stat.st_size
+        )
+        return data
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def parse_yaml_from_package(
+        package_path: str, filename: str, mtime_ns: int, size: int
+    ) -> Any:
+        """
+        Read and parse a YAML file from a package - cached by all arguments.
+
+        Args:
+            package_path (str): Path to the package.
+            filename (str): Name of the YAML file inside the package.
+            mtime_ns (int): modification time of the package as cache key part
+            size (int): size of the package as cache key part
+
+        Returns:
+            Any: the parsed YAML data
+        """
+        yaml_str = Packager.read_from_package(package_path, filename).decode("utf-8")
+        data = yaml.safe_load(yaml_str)
+        return data
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def get_tar_index(
+        tarball_path: str, mtime_ns: int, size: int
+    ) -> Dict[str, Tuple[int, int]]:
+        """
+        Index the regular files of an uncompressed tarball - cached by all arguments.
+
+        Args:
+            tarball_path (str): Path to the tarball.
+            mtime_ns (int): modification time of the tarball as cache key part
+            size (int): size of the tarball as cache key part
+
+        Returns:
+            Dict[str, Tuple[int, int]]: member name -> (data offset, data size)
+
+        Raises:
+            tarfile.ReadError: if the tarball is compressed
+        """
+        with tarfile.open(tarball_path, "r:") as tar:
+            tar_index = {
+                member.name: (member.offset_data, member.size)
+                for member in tar.getmembers()
+                if member.isfile()
+            }
+        return tar_index
+
+    @classmethod
+    def get_member_range(
+        cls, package_path: Union[str, Path], filename: str
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Get the location of a file's bytes in a plain (uncompressed) tarball.
+
+        Args:
+            package_path (Union[str, Path]): Path to the package.
+            filename (str): Name of the file inside the package.
+
+        Returns:
+            Optional[Tuple[int, int]]: (data offset, data size) or None if the
+            package is not a plain tarball or the file is not a regular member
+        """
+        member_range = None
+        if cls.get_package_mode(package_path) == PackageMode.TAR:
+            stat = os.stat(package_path)
+            try:
+                tar_index = cls.get_tar_index(
+                    str(package_path), stat.st_mtime_ns, stat.st_size
+                )
+                member_range = tar_index.get(filename)
+            except tarfile.ReadError:
+                pass
+        return member_range
+
+    @staticmethod
+    def iter_file_range(
+        path: Union[str, Path], offset: int, size: int, chunk_size: int = 65536
+    ) -> Generator[bytes, None, None]:
+        """
+        Generate the bytes of a file range in chunks.
+
+        Args:
+            path (Union[str, Path]): Path to the file.
+            offset (int): start of the range
+            size (int): length of the range
+            chunk_size (int): maximum number of bytes per chunk
+
+        Yields:
+            bytes: the next chunk of the range
+        """
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remaining = size
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
     @staticmethod
     def _read_from_tar(tarball_path: Path, filename: str) -> bytes:
+        # plain tarballs are read directly at the indexed offset
+        # instead of scanning the member headers on every read
+        entry = Packager.get_member_range(tarball_path, filename)
+        if entry is not None:
+            offset, size = entry
+            with open(tarball_path, "rb") as f:
+                f.seek(offset)
+                return f.read(size)
         with tarfile.open(tarball_path, "r") as tar:
             try:
                 member = tar.getmember(filename)
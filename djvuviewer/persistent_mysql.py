@@ -0,0 +1,82 @@
+"""
+Created on 2026-10-15
+
+@author: wf
+"""
+
+import threading
+from typing import Any, Dict, List
+
+import pymysql
+from lodstorage.mysql import MySqlQuery
+from lodstorage.query import Endpoint
+
+
+class PersistentMySqlQuery(MySqlQuery):
+    """
+    MySqlQuery that keeps its connection open across queries instead of
+    connecting and authenticating for every single query.
+    """
+
+    def __init__(self, endpoint: Endpoint, debug: bool = False):
+        """
+        Initialize with the given endpoint.
+
+        Args:
+            endpoint (Endpoint): endpoint configuration.
+            debug (bool): Flag to enable debugging.
+        """
+        super().__init__(endpoint, debug=debug)
+        # without autocommit a long lived connection would keep reading
+        # the snapshot of its first query
+        self.db_params["autocommit"] = True
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def get_connection(self) -> pymysql.connections.Connection:
+        """
+        Get my connection - (re)connecting if needed.
+
+        Returns:
+            the open connection
+        """
+        if self.connection is None:
+            self.connection = pymysql.connect(**self.db_params)
+        else:
+            self.connection.ping(reconnect=True)
+        return self.connection
+
+    def execute_sql_query(
+        self, query: str, commit: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Executes an SQL query on my persistent connection.
+
+        Args:
+            query (str): The SQL query to execute.
+            commit (bool): if True, commit after the query
+
+        Returns:
+            list: A list of dictionaries representing the query results.
+        """
+        with self.lock:
+            connection = self.get_connection()
+            with connection.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute(query)
+                if cursor.description is None:
+                    raw_lod = []
+                else:
+                    raw_lod = cursor.fetchall()
+            if commit:
+                connection.commit()
+        lod = [self.decode_record(raw_row) for raw_row in raw_lod]
+        return lod
+
+    def close(self):
+        """
+        Close my connection.
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
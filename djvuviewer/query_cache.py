@@ -0,0 +1,128 @@
+"""
+Created on 2026-10-15
+
+@author: wf
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from lodstorage.multilang_querymanager import MultiLanguageQueryManager
+from lodstorage.params import Params
+from lodstorage.query import Query
+
+
+class IndexedMultiLanguageQueryManager(MultiLanguageQueryManager):
+    """
+    MultiLanguageQueryManager with a flat name -> Query index
+    so that query4Name is a single dict lookup
+    """
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the query manager - see MultiLanguageQueryManager for the arguments.
+        """
+        super().__init__(*args, **kwargs)
+        # the first language defining a name wins as in the linear scan
+        self.query_index: Dict[str, Query] = {}
+        for qm in reversed(list(self.qms.values())):
+            self.query_index.update(qm.queriesByName)
+        self.query_names = list(self.query_index)
+
+    def query4Name(self, name: str) -> Optional[Query]:
+        """
+        Return the Query object for the given name.
+
+        Args:
+            name: query name as defined in the YAML file
+
+        Returns:
+            Query object or None
+        """
+        query = self.query_index.get(name)
+        return query
+
+
+class QueryCache:
+    """
+    process wide cache for the query managers of the query YAML files -
+    keyed by path, modification time and size so that edited files are reparsed
+    """
+
+    @staticmethod
+    def get_file_key(path: Optional[str]) -> Tuple[int, int]:
+        """
+        Get the freshness key of the given file.
+
+        Args:
+            path: the path of the file
+
+        Returns:
+            (mtime_ns, size) - (0, 0) if there is no such file
+        """
+        file_key = (0, 0)
+        if path is not None:
+            try:
+                stat = os.stat(path)
+                file_key = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                pass
+        return file_key
+
+    @classmethod
+    def get_mlqm(cls, yaml_path: Optional[str]) -> IndexedMultiLanguageQueryManager:
+        """
+        Get the query manager for the given queries file - without an endpoint
+        so there is no backend state and the instance is shared process wide.
+
+        The Query objects are shared as well - use get_sql_query instead of
+        query.params to apply parameters.
+
+        Args:
+            yaml_path: path to the YAML queries file - None for the lodstorage defaults
+
+        Returns:
+            IndexedMultiLanguageQueryManager: the (cached) query manager
+        """
+        mtime_ns, size = cls.get_file_key(yaml_path)
+        mlqm = cls.load_mlqm(yaml_path, mtime_ns, size)
+        return mlqm
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def load_mlqm(
+        yaml_path: Optional[str], mtime_ns: int, size: int
+    ) -> IndexedMultiLanguageQueryManager:
+        """
+        Load a query manager without endpoint - cached by all arguments.
+
+        Args:
+            yaml_path: path to the YAML queries file - None for the lodstorage defaults
+            mtime_ns: modification time of the queries file as cache key part
+            size: size of the queries file as cache key part
+
+        Returns:
+            IndexedMultiLanguageQueryManager: the query manager
+        """
+        mlqm = IndexedMultiLanguageQueryManager(yaml_path=yaml_path)
+        return mlqm
+
+    @staticmethod
+    def get_sql_query(query: Query, param_dict: Optional[Dict] = None) -> str:
+        """
+        Get the SQL of the given query with the given parameters applied.
+
+        Uses a fresh Params per call - Query.params keeps the applied
+        parameters and is shared by all threads using the same Query.
+
+        Args:
+            query: the named query
+            param_dict: the parameters to apply
+
+        Returns:
+            str: the SQL query string
+        """
+        params = Params(query.query)
+        sql_query = params.apply_parameters_with_check(param_dict, query.param_list)
+        return sql_query
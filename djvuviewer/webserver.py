@@ -15,6 +15,7 @@ from ngwidgets.sso_users_solution import SsoSolution
 from ngwidgets.webserver import WebserverConfig
 from ngwidgets.widgets import Link
 from nicegui import Client, app, ui
+from starlette.requests import Request
 from starlette.responses import FileResponse, HTMLResponse
 from wikibot3rd.sso_users import Sso_Users
 
@@ -49,6 +50,8 @@ class DjVuViewerWebServer(InputWebserver):
         self.users = Sso_Users(self.config.short_name)
         self.login = Login(self, self.users)
         self.djvu_config = DjVuConfig.get_instance()
+        # the viewer reads while the indexer writes - the example db keeps its journal mode
+        self.djvu_config.wal_mode = not self.djvu_config.is_example
 
         @ui.page("/")
         async def home(client: Client):
@@ -76,17 +79,20 @@ class DjVuViewerWebServer(InputWebserver):
         app.add_static_files("/backups", self.djvu_config.backup_path)
 
         @app.get("/djvu/content/{file:path}")
-        def get_content(file: str) -> FileResponse:
+        def get_content(file: str, request: Request) -> FileResponse:
             """
             Serves content from a wrapped DjVu file.
 
             Args:
                 file (str): The full path  <DjVu name>/<file name>.
+                request (Request): the request - for the If-None-Match header
 
             Returns:
                 FileResponse: The requested content file (PNG, JPG, YAML, etc.).
             """
-            file_response = self.djvu_viewer.get_content(file)
+            file_response = self.djvu_viewer.get_content(
+                file, if_none_match=request.headers.get("if-none-match")
+            )
             return file_response
 
         @app.get("/djvu/download/{path:path}")
@@ -104,6 +110,7 @@ class DjVuViewerWebServer(InputWebserver):
         def get_djvu_page_with_scale(
             path: str,
             pageno: int,
+            request: Request,
             scale: float = 1.0,
             ext: str = "png",
             quality: int = 85,
@@ -114,12 +121,18 @@ class DjVuViewerWebServer(InputWebserver):
             Args:
                 path (str): The path to the DjVu document.
                 pageno (int): The page number within the DjVu document.
+                request (Request): the request - for the If-None-Match header
                 scale(float,optional): the scale of the jpg impage
                 ext (str): The desired file extension for the page ("png" or "jpg").
                 quality (int, optional): The desired jpg quality - default:85
             """
             file_response = self.djvu_viewer.get_page4path(
-                path, pageno, ext=ext, scale=scale, quality=quality
+                path,
+                pageno,
+                ext=ext,
+                scale=scale,
+                quality=quality,
+                if_none_match=request.headers.get("if-none-match"),
             )
             return file_response
 
@@ -127,6 +140,7 @@ class DjVuViewerWebServer(InputWebserver):
         def get_djvu_page(
             path: str,
             pageno: int,
+            request: Request,
             scale: float = 1.0,
             ext: str = "png",
             quality: int = 85,
@@ -137,12 +151,18 @@ class DjVuViewerWebServer(InputWebserver):
             Args:
                 path (str): The path to the DjVu document.
                 pageno (int): The page number within the DjVu document.
+                request (Request): the request - for the If-None-Match header
                 scale(float,optional): the scale of the jpg impage
                 ext (str): The desired file extension for the page ("png" or "jpg").
                 quality (int, optional): The desired jpg quality - default:85
             """
             file_response = self.djvu_viewer.get_page4path(
-                path, pageno, ext=ext, scale=scale, quality=quality
+                path,
+                pageno,
+                ext=ext,
+                scale=scale,
+                quality=quality,
+                if_none_match=request.headers.get("if-none-match"),
             )
             return file_response
 
@@ -6,17 +6,22 @@ Created on 2026-01-02
 
 import logging
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import field
 from datetime import datetime
-from typing import Any, Dict, Iterable, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, Generator, Iterable, List, Optional, Union
 from urllib.parse import unquote
 
 import requests
 from basemkit.yamlable import lod_storable
-from ngwidgets.progress import Progressbar
 
 from djvuviewer.version import Version
 
+if TYPE_CHECKING:
+    # the progress bars pull in nicegui - only needed for the annotations
+    from ngwidgets.progress import Progressbar
+
 logger = logging.getLogger(__name__)
 
 
@@ -26,6 +31,8 @@ class MediaWikiImage:
     Represents a single image resource from MediaWiki.
     """
 
+    DUPLICATE_SLASHES = re.compile(r"/+")
+
     url: str
     mime: str
     size: int
@@ -67,11 +74,11 @@ class MediaWikiImage:
         """retrieve wiki image-relative path from url by removing './' and '/images/'."""
         path = unquote(url)
         # Look for 'images/' anywhere in the path and extract everything after it
-        match = re.search(r"images/(.*)", path)
+        pos = path.find("images/")
 
-        if match:
+        if pos >= 0:
             # Extract the part after 'images/' and prepend '/'
-            cleaned_path = "/" + match.group(1)
+            cleaned_path = "/" + path[pos + len("images/") :]
         else:
             # No 'images/' found - just handle './' prefix
             if path.startswith("./"):
@@ -79,8 +86,9 @@ class MediaWikiImage:
             else:
                 cleaned_path = path
 
-        # Remove duplicate slashes
-        cleaned_path = re.sub(r"/+", "/", cleaned_path)
+        # Remove duplicate slashes - only scan again if there are any
+        if "//" in cleaned_path:
+            cleaned_path = MediaWikiImage.DUPLICATE_SLASHES.sub("/", cleaned_path)
 
         return cleaned_path
 
@@ -110,6 +118,7 @@ class MediaWikiImages:
         aiprop: Optional[Iterable[str]] = None,
         timeout: int = 30,
         session: Optional[requests.Session] = None,
+        max_retries: int = 3,
     ):
         """
         Args:
@@ -118,9 +127,11 @@ class MediaWikiImages:
             aiprop: Properties to request. Defaults to url, mime, size, timestamp, user, dimensions.
             timeout: Per-request timeout in seconds.
             session: Optional requests.Session to reuse connections.
+            max_retries: Retries with exponential backoff for throttled (429) or failing (5xx) requests.
         """
         self.api_url = api_url
         self.timeout = timeout
+        self.max_retries = max_retries
         self.session = session or requests.Session()
 
         # Default filters
@@ -176,17 +187,17 @@ class MediaWikiImages:
     def fetch_allimages(
         self,
         limit: int,
-        per_request: int = 50,
+        per_request: int = 500,
         extra_params: Optional[Dict[str, str]] = None,
         as_objects: bool = False,
-        progressbar: Optional[Progressbar] = None,
+        progressbar: Optional["Progressbar"] = None,
     ) -> Union[List[MediaWikiImage], List[Dict]]:
         """
         Retrieve up to 'limit' images.
 
         Args:
             limit: Maximum number of image records to return.
-            per_request: Page size for each API call (max 50 normally, 500 for bots).
+            per_request: Page size for each API call (max 500 normally, 5000 for bots).
             extra_params: Extra query params to merge into the request.
             as_objects: If True, returns List[MediaWikiImage]. If False, returns List[Dict].
 
@@ -197,9 +208,66 @@ class MediaWikiImages:
             progressbar.total = limit or 0  # Set total if known
 
         results = []
+        for batch in self.iter_allimages(
+            limit, per_request=per_request, extra_params=extra_params
+        ):
+            if as_objects:
+                results.extend([MediaWikiImage.from_dict(img) for img in batch])
+            else:
+                results.extend(batch)
+            # Update progress bar
+            if progressbar:
+                progressbar.update(len(batch))
+        return results
+
+    def fetch_allimages_iter(
+        self,
+        limit: int,
+        per_request: int = 500,
+        extra_params: Optional[Dict[str, str]] = None,
+        as_objects: bool = False,
+    ) -> Generator[Union[MediaWikiImage, Dict], None, None]:
+        """
+        Generate up to 'limit' images one by one so that callers which only
+        reduce the images (e.g. count or oldest/newest timestamp) do not
+        need to keep them all in memory and may stop early.
+
+        Args:
+            limit: Maximum number of image records to return.
+            per_request: Page size for each API call (max 500 normally, 5000 for bots).
+            extra_params: Extra query params to merge into the request.
+            as_objects: If True, yields MediaWikiImage objects. If False, yields Dicts.
+
+        Yields:
+            MediaWikiImage objects or dictionaries.
+        """
+        for batch in self.iter_allimages(
+            limit, per_request=per_request, extra_params=extra_params
+        ):
+            for img in batch:
+                if as_objects:
+                    img = MediaWikiImage.from_dict(img)
+                yield img
+
+    def iter_allimages(
+        self,
+        limit: int,
+        per_request: int = 500,
+        extra_params: Optional[Dict[str, str]] = None,
+    ) -> Generator[List[Dict], None, None]:
+        """
+        Generate the raw image records page by page following the
+        API continuation until 'limit' images have been retrieved.
+
+        Args:
+            limit: Maximum number of image records to return.
+            per_request: Page size for each API call (max 500 normally, 5000 for bots).
+            extra_params: Extra query params to merge into the request.
+
+        Yields:
+            List[Dict]: the image records of one API response
+        """
         remaining = max(0, int(limit))
-        if remaining == 0:
-            return results
 
         base_params = {
             "action": "query",
@@ -230,17 +298,9 @@ class MediaWikiImages:
             if not images_raw:
                 break
 
-            # Append up to 'remaining'
+            # Yield up to 'remaining'
             take = min(remaining, len(images_raw))
-            batch = images_raw[:take]
-
-            if as_objects:
-                results.extend([MediaWikiImage.from_dict(img) for img in batch])
-            else:
-                results.extend(batch)
-            # Update progress bar
-            if progressbar:
-                progressbar.update(len(batch))
+            yield images_raw[:take]
 
             remaining -= take
 
@@ -251,8 +311,6 @@ class MediaWikiImages:
             else:
                 break
 
-        return results
-
     def build_size_filter(
         self, min_size: Optional[int] = None, max_size: Optional[int] = None
     ) -> str:
@@ -320,46 +378,73 @@ class MediaWikiImages:
         return titles
 
     def fetch_images_by_titles(
-        self, titles: List[str], progressbar: Optional[Progressbar] = None
+        self,
+        titles: List[str],
+        progressbar: Optional["Progressbar"] = None,
+        chunk_size: int = 50,
+        max_workers: int = 1,
     ) -> List[MediaWikiImage]:
         """
-        Fetch full image details for a list of titles.
+        Fetch full image details for a list of titles with one request per chunk.
 
         Args:
-            titles: List of file titles (e.g., ["File:Example.jpg"])
+            titles: List of file titles (e.g., ["File:Example.jpg"]) - titles
+                without namespace get the File: prefix as in fetch_image
             progressbar: Optional progress bar
+            chunk_size: titles per request (API limit: 50, 500 for bots)
+            max_workers: maximum number of chunk requests running in parallel
 
         Returns:
             List of MediaWikiImage objects with full details
         """
         images = []
+        titles = [title if ":" in title else f"File:{title}" for title in titles]
+        batches = [
+            titles[i : i + chunk_size] for i in range(0, len(titles), chunk_size)
+        ]
+        if batches:
+            workers = max(1, min(max_workers, len(batches)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map keeps the batch order
+                for batch, batch_images in zip(
+                    batches, executor.map(self.fetch_images_batch, batches)
+                ):
+                    images.extend(batch_images)
+                    if progressbar:
+                        progressbar.update(len(batch))
 
-        # Fetch in batches (API limit: 50 titles per request)
-        for i in range(0, len(titles), 50):
-            batch = titles[i : i + 50]
-            params = {
-                "action": "query",
-                "titles": "|".join(batch),
-                "prop": "imageinfo",
-                "iiprop": "|".join(self.aiprop),
-                "format": "json",
-            }
+        return images
 
-            data = self._make_request(params)
-            pages = data.get("query", {}).get("pages", {})
+    def fetch_images_batch(self, batch: List[str]) -> List[MediaWikiImage]:
+        """
+        Fetch the image details for a batch of titles in a single API request.
 
-            for page_id, page_data in pages.items():
-                imageinfo = page_data.get("imageinfo", [])
-                if imageinfo:
-                    # Merge page title into the image info dict to match 'allimages' structure
-                    info_dict = imageinfo[0].copy()
-                    info_dict["title"] = page_data.get("title")
-                    info_dict["page_id"] = page_id
-                    images.append(MediaWikiImage.from_dict(info_dict))
+        Args:
+            batch: the file titles - at most the API limit of titles per request
 
-            if progressbar:
-                progressbar.update(len(batch))
+        Returns:
+            List of MediaWikiImage objects for the titles that have image info
+        """
+        images = []
+        params = {
+            "action": "query",
+            "titles": "|".join(batch),
+            "prop": "imageinfo",
+            "iiprop": "|".join(self.aiprop),
+            "format": "json",
+        }
+
+        data = self._make_request(params)
+        pages = data.get("query", {}).get("pages", {})
 
+        for page_id, page_data in pages.items():
+            imageinfo = page_data.get("imageinfo", [])
+            if imageinfo:
+                # Merge page title into the image info dict to match 'allimages' structure
+                info_dict = imageinfo[0].copy()
+                info_dict["title"] = page_data.get("title")
+                info_dict["page_id"] = page_id
+                images.append(MediaWikiImage.from_dict(info_dict))
         return images
 
     def fetch_by_cirrus_search(
@@ -369,7 +454,7 @@ class MediaWikiImages:
         per_request: int = 50,
         min_size_kb: Optional[int] = None,
         max_size_kb: Optional[int] = None,
-        progressbar: Optional[Progressbar] = None,
+        progressbar: Optional["Progressbar"] = None,
     ) -> List[MediaWikiImage]:
         """
         Search for files using CirrusSearch, then fetch full image details.
@@ -404,13 +489,24 @@ class MediaWikiImages:
         Helper to execute the request and handle basic errors.
         """
         headers = {"User-Agent": f"{self.user_agent} (via {self.__class__.__name__})"}
-        resp = self.session.get(
-            self.api_url,
-            params=params,
-            timeout=self.timeout,
-            headers=headers,
-            allow_redirects=True,
-        )
+        for attempt in range(self.max_retries + 1):
+            resp = self.session.get(
+                self.api_url,
+                params=params,
+                timeout=self.timeout,
+                headers=headers,
+                allow_redirects=True,
+            )
+            retryable = resp.status_code == 429 or resp.status_code >= 500
+            if not retryable or attempt == self.max_retries:
+                break
+            # back off - honor the server's Retry-After if given
+            retry_after = resp.headers.get("Retry-After", "")
+            delay = int(retry_after) if retry_after.isdigit() else 2**attempt
+            logger.warning(
+                f"HTTP {resp.status_code} from {self.api_url} - retrying in {delay}s"
+            )
+            time.sleep(delay)
         resp.raise_for_status()
         data = resp.json()
 
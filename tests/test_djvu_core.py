@@ -4,12 +4,13 @@ Created on 2026-07-01
 @author: wf
 """
 
+from dataclasses import asdict
 from pathlib import Path
 
 from basemkit.basetest import Basetest
 
 from djvuviewer.djvu_config import DjVuConfig
-from djvuviewer.djvu_core import DjVuFile
+from djvuviewer.djvu_core import DjVu, DjVuFile, DjVuPage
 
 
 class TestDjVuCore(Basetest):
@@ -36,3 +37,86 @@ class TestDjVuCore(Basetest):
                 self.assertIsNotNone(djvu_file, package_path)
                 if self.debug:
                     print(djvu_file.to_yaml())
+
+    def test_total_page_size(self):
+        """
+        test the total page size for small and large page counts
+        """
+        for page_count in [0, 3, DjVuFile.JIT_PAGE_THRESHOLD + 1]:
+            with self.subTest(page_count=page_count):
+                pages = []
+                for page_index in range(1, page_count + 1):
+                    page = DjVuPage.get_sample()
+                    page.page_index = page_index
+                    # every other page without filesize
+                    page.filesize = page_index if page_index % 2 else None
+                    pages.append(page)
+                djvu_file = DjVuFile(path="/test.djvu", page_count=page_count)
+                djvu_file.pages = pages
+                expected = sum(p.filesize or 0 for p in pages)
+                self.assertEqual(expected, djvu_file.warm_aggregates())
+                self.assertEqual(
+                    (page_count, expected), djvu_file.page_totals["filesize"]
+                )
+                self.assertEqual(expected, djvu_file.total_page_size)
+
+    def test_summaries(self):
+        """
+        test the derived DjVuFile summaries
+        """
+        page = DjVuPage.get_sample()
+        page.width = 2480
+        page.height = 3508
+        page.dpi = 300
+        for pages, bundled, expected in [
+            ([], False, ("Indirect/Indexed", "—", "—")),
+            ([page], True, ("Bundled", "2480×3508", "300")),
+        ]:
+            with self.subTest(pages=len(pages)):
+                djvu_file = DjVuFile(
+                    path="/test.djvu", page_count=len(pages), bundled=bundled
+                )
+                djvu_file.pages = pages
+                summary = (
+                    djvu_file.format_type_str,
+                    djvu_file.dims_str,
+                    djvu_file.dpi_str,
+                )
+                self.assertEqual(expected, summary)
+
+    def test_page_array(self):
+        """
+        test the page column arrays
+        """
+        pages = []
+        for page_index in range(1, 4):
+            page = DjVuPage.get_sample()
+            page.page_index = page_index
+            page.width = page_index * 100
+            page.dpi = None if page_index == 2 else 300
+            pages.append(page)
+        djvu_file = DjVuFile(path="/test.djvu", page_count=len(pages))
+        djvu_file.pages = pages
+        for attr, expected in [("width", [100, 200, 300]), ("dpi", [300, 0, 300])]:
+            with self.subTest(attr=attr):
+                self.assertEqual(expected, djvu_file.get_page_array(attr).tolist())
+        total = sum(page.filesize for page in pages)
+        max_height = pages[0].height
+        self.assertEqual((total, 300, max_height), djvu_file.get_page_aggregates())
+
+    def test_from_record(self):
+        """
+        test creating pages and files from flat database records
+        """
+        for cls, sample in [
+            (DjVuPage, DjVuPage.get_sample()),
+            (DjVuFile, DjVu.get_sample()),
+        ]:
+            with self.subTest(cls=cls.__name__):
+                record = asdict(sample)
+                # extra columns e.g. from window queries are ignored
+                record["page_rank"] = 1
+                self.assertEqual(cls.from_dict(record), cls.from_record(record))
+                # incomplete records fall back to the field defaults
+                del record["filename"]
+                self.assertEqual(cls.from_dict(record), cls.from_record(record))
@@ -0,0 +1,132 @@
+"""
+Created on 2026-10-15
+
+@author: wf
+"""
+
+import os
+import tempfile
+
+from basemkit.basetest import Basetest
+
+from djvuviewer.djvu_config import DjVuConfig
+from djvuviewer.djvu_manager import DjVuManager
+
+
+class TestDjVuManager(Basetest):
+    """
+    Test the DjVuManager storage against a temporary database
+    """
+
+    def setUp(self, debug=True, profile=True):
+        """
+        setUp test environment
+        """
+        Basetest.setUp(self, debug=debug, profile=profile)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = DjVuConfig(is_example=True)
+        self.config.db_path = os.path.join(self.tmp_dir.name, "djvu_test.db")
+        self.dvm = DjVuManager(self.config)
+
+    def tearDown(self):
+        """
+        close the database and remove the temporary directory
+        """
+        self.dvm.sql_db.close()
+        self.tmp_dir.cleanup()
+        Basetest.tearDown(self)
+
+    def get_rows(self, sql: str) -> list:
+        """
+        get the rows of the given sql query as tuples
+        """
+        rows = self.dvm.sql_db.c.execute(sql).fetchall()
+        return rows
+
+    def test_store_rollback(self):
+        """
+        test that a failing chunk rolls back drop, create and all chunks
+        """
+        lod = [{"path": f"/{i}.djvu", "page_count": i} for i in range(10)]
+        self.dvm.store(lod, "djvu", "path", with_drop=True, sampleRecordCount=1)
+        bad_lod = [{"path": f"/new{i}.djvu", "page_count": i} for i in range(10)]
+        # a value sqlite can not bind in the last chunk
+        bad_lod[-1]["page_count"] = object()
+        with self.assertRaises(Exception):
+            self.dvm.store(
+                bad_lod,
+                "djvu",
+                "path",
+                with_drop=True,
+                sampleRecordCount=1,
+                chunk_size=3,
+            )
+        rows = self.get_rows("SELECT path FROM djvu ORDER BY page_count")
+        self.assertEqual([f"/{i}.djvu" for i in range(10)], [row[0] for row in rows])
+
+    def test_store_many(self):
+        """
+        test that store_many stores lazily generated rows of several entities
+        and rolls back all of them if a row fails
+        """
+        self.dvm.sql_db.c.execute("CREATE TABLE djvu(path TEXT PRIMARY KEY, pages INT)")
+        self.dvm.sql_db.c.execute(
+            "CREATE TABLE page(path TEXT, page_index INT, PRIMARY KEY(path, page_index))"
+        )
+        page_rows = ((f"/{i // 2}.djvu", i % 2) for i in range(6))
+        djvu_rows = ((f"/{i}.djvu", 2) for i in range(3))
+        self.dvm.store_many(
+            [
+                ("page", ("path", "page_index"), page_rows),
+                ("djvu", ("path", "pages"), djvu_rows),
+            ]
+        )
+        self.assertEqual(6, len(self.get_rows("SELECT * FROM page")))
+        djvu_rows = self.get_rows("SELECT path, pages FROM djvu ORDER BY path")
+        self.assertEqual([(f"/{i}.djvu", 2) for i in range(3)], djvu_rows)
+        # a value sqlite can not bind in the last row of the second entity
+        with self.assertRaises(Exception):
+            self.dvm.store_many(
+                [
+                    ("page", ("path", "page_index"), [("/3.djvu", 0)]),
+                    (
+                        "djvu",
+                        ("path", "pages"),
+                        [("/3.djvu", 1), ("/4.djvu", object())],
+                    ),
+                ]
+            )
+        self.assertEqual(6, len(self.get_rows("SELECT * FROM page")))
+        self.assertEqual(3, len(self.get_rows("SELECT * FROM djvu")))
+
+    def test_migrate_to_package_fields(self):
+        """
+        test that an old layout table is migrated once and the
+        marker short-circuits the second run
+        """
+        self.dvm.sql_db.c.execute(
+            "CREATE TABLE djvu(relpath TEXT PRIMARY KEY, tar_filesize INT, tar_iso_date TEXT)"
+        )
+        self.dvm.sql_db.c.execute(
+            "INSERT INTO djvu VALUES('/1.djvu', 42, '2025-02-26')"
+        )
+        self.dvm.sql_db.c.commit()
+        self.assertIsNone(self.dvm.get_schema_meta("djvu.package_fields"))
+        self.dvm.migrate_to_package_fields()
+        marker = self.dvm.get_schema_meta("djvu.package_fields")
+        self.assertIsNotNone(marker)
+        rows = self.get_rows(
+            "SELECT path, package_filesize, package_iso_date, filename FROM djvu"
+        )
+        self.assertEqual([("/1.djvu", 42, "2025-02-26", None)], rows)
+        # a second run is a single marker lookup without probing or writing
+        statements = []
+        self.dvm.sql_db.c.set_trace_callback(statements.append)
+        try:
+            self.dvm.migrate_to_package_fields()
+        finally:
+            self.dvm.sql_db.c.set_trace_callback(None)
+        self.assertTrue(statements)
+        for statement in statements:
+            self.assertTrue(statement.startswith("SELECT"), statement)
+        self.assertEqual(marker, self.dvm.get_schema_meta("djvu.package_fields"))
@@ -4,6 +4,12 @@ Created on 2026-01-07
 @author: wf
 """
 
+import os
+import pickle
+import tempfile
+import threading
+from datetime import datetime, timezone
+
 from basemkit.basetest import Basetest
 
 from djvuviewer.djvu_config import DjVuConfig
@@ -40,3 +46,68 @@ class TestDjVuMediaWikiMages(Basetest):
                 if self.debug:
                     print(f"{name}:{url} -> {len(cache.images)} with limit {limit}")
                 self.assertGreaterEqual(len(cache.images), expected)
+
+    def test_fetch_waits_for_lock(self):
+        """
+        test that fetch waits for the cache file lock and then reuses
+        the cache written meanwhile instead of fetching again
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = os.path.join(tmp_dir, "djvu_images_test.json")
+            # no network access - the url is never contacted
+            url = "http://localhost:1/"
+            results = []
+            with DjVuImagesCache.lock_cache_file(cache_file):
+                thread = threading.Thread(
+                    target=lambda: results.append(
+                        DjVuImagesCache.fetch(
+                            cache_file, url, "test", 10, freshness_days=1
+                        )
+                    )
+                )
+                thread.start()
+                thread.join(timeout=0.5)
+                # still waiting for the lock
+                self.assertTrue(thread.is_alive())
+                fresh_cache = DjVuImagesCache(
+                    name="test", url=url, last_fetch=datetime.now(timezone.utc)
+                )
+                fresh_cache.save_json(cache_file)
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(1, len(results))
+            self.assertEqual("test", results[0].name)
+            self.assertTrue(results[0].is_fresh(1))
+
+    def test_outdated_snapshot(self):
+        """
+        test that a snapshot with another signature falls back to the json file
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_file = os.path.join(tmp_dir, "djvu_images_test.json")
+            snapshot_file = DjVuImagesCache.get_snapshot_file(cache_file)
+            json_cache = DjVuImagesCache(
+                name="json", url="http://localhost:1/", last_fetch=None
+            )
+            json_cache.save_json(cache_file)
+            for snapshot in [
+                # the layout before the snapshot signature
+                {"name": "stale", "url": "", "images": [], "last_fetch": None},
+                {"signature": ("old",), "state": {"name": "stale"}},
+                "garbage",
+            ]:
+                with self.subTest(snapshot=snapshot):
+                    with open(snapshot_file, "wb") as f:
+                        pickle.dump(snapshot, f)
+                    cache = DjVuImagesCache.load_cache_file(cache_file)
+                    self.assertEqual("json", cache.name)
+                    # the snapshot has been rewritten with the current signature
+                    with open(snapshot_file, "rb") as f:
+                        rewritten = pickle.load(f)
+                    self.assertEqual(
+                        DjVuImagesCache.get_snapshot_signature(),
+                        rewritten["signature"],
+                    )
+                    self.assertEqual(
+                        "json", DjVuImagesCache.load_cache_file(cache_file).name
+                    )
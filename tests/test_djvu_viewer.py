@@ -0,0 +1,111 @@
+"""
+Created on 2026-10-15
+
+@author: wf
+"""
+
+import os
+import tarfile
+import tempfile
+
+from basemkit.basetest import Basetest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from djvuviewer.djvu_config import DjVuConfig
+from djvuviewer.djvu_viewer import DjVuViewer
+
+
+class TestDjVuViewer(Basetest):
+    """
+    Test the DjVuViewer content serving
+    """
+
+    def setUp(self, debug=True, profile=True):
+        """
+        setUp test environment
+        """
+        Basetest.setUp(self, debug=debug, profile=profile)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = DjVuConfig(is_example=True)
+        self.config.cache_path = self.tmp_dir.name
+        self.app = FastAPI()
+        self.viewer = DjVuViewer(app=self.app, config=self.config)
+
+        @self.app.get("/djvu/content/{file:path}")
+        def get_content(file: str, request: Request):
+            """
+            serve content the way the webserver does
+            """
+            content_response = self.viewer.get_content(
+                file, if_none_match=request.headers.get("if-none-match")
+            )
+            return content_response
+
+        self.client = TestClient(self.app)
+
+    def tearDown(self):
+        """
+        remove the temporary directory
+        """
+        self.tmp_dir.cleanup()
+        Basetest.tearDown(self)
+
+    def test_prune_jpg_cache(self):
+        """
+        test that the jpg cache evicts the least recently used files
+        """
+        max_bytes = DjVuViewer.JPG_CACHE_MAX_BYTES
+        DjVuViewer.JPG_CACHE_MAX_BYTES = 1000
+        try:
+            jpg_paths = [self.viewer.jpg_cache_path / f"{i}.jpg" for i in range(11)]
+            for i, jpg_path in enumerate(jpg_paths[:10]):
+                self.viewer.store_jpg(jpg_path, b"x" * 100)
+                os.utime(jpg_path, ns=(i, i))
+            # the oldest file is used again
+            os.utime(jpg_paths[0], ns=(100, 100))
+            self.viewer.store_jpg(jpg_paths[10], b"x" * 100)
+        finally:
+            DjVuViewer.JPG_CACHE_MAX_BYTES = max_bytes
+        remaining = [jpg_path.exists() for jpg_path in jpg_paths]
+        expected = [True, False, False] + [True] * 8
+        self.assertEqual(expected, remaining)
+        self.assertEqual(900, self.viewer.jpg_cache_size)
+
+    def test_get_package_location(self):
+        """
+        test that the cached package location follows config changes
+        """
+        path, package_filename, package_path = self.viewer.get_package_location(
+            "AB 1932.djvu"
+        )
+        self.assertEqual("AB_1932.djvu", path)
+        self.assertEqual(f"AB_1932.{self.viewer.package_mode.ext}", package_filename)
+        self.config.package_path = self.tmp_dir.name
+        _, _, moved_package_path = self.viewer.get_package_location("AB 1932.djvu")
+        self.assertEqual(self.tmp_dir.name, str(moved_package_path.parent))
+        self.assertNotEqual(package_path, moved_package_path)
+
+    def test_get_content(self):
+        """
+        test the streamed content and the 304 response for a current ETag
+        """
+        djvu_name = "AB1932-Ramrath"
+        filename = f"{djvu_name}_page_0001.png"
+        package_path = self.viewer.get_package_path(djvu_name)
+        with tarfile.open(package_path) as tar:
+            expected = tar.extractfile(filename).read()
+        url = f"/djvu/content/{djvu_name}/{filename}"
+        response = self.client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("image/png", response.headers["content-type"])
+        self.assertEqual(str(len(expected)), response.headers["content-length"])
+        self.assertEqual(expected, response.content)
+        etag = response.headers["etag"]
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response.headers["etag"])
+        self.assertEqual(b"", response.content)
+        response = self.client.get(url, headers={"If-None-Match": '"outdated"'})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(expected, response.content)
@@ -142,3 +142,7 @@ class TestMediaWikiImages(Basetest):
                     else:
                         self.assertTrue(isinstance(img, Dict))
                 self.assertEqual(len(images), limit)
+                images_iter = self.mwi.fetch_allimages_iter(
+                    limit=limit, as_objects=as_objects
+                )
+                self.assertEqual(len(list(images_iter)), limit)